@@ -0,0 +1,83 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    """No model slot became free within the queue-wait timeout."""
+
+
+class ModelExecutor:
+    """Runs blocking model calls on a dedicated pool with single-flight.
+
+    At most `max_inflight` upstream calls run at once; callers wait up to
+    `queue_timeout` seconds for a slot before getting Overloaded. Identical
+    keys submitted while a call is in flight share its Future instead of
+    starting their own call.
+    """
+
+    def __init__(self, max_inflight=8, queue_timeout=10.0, call_timeout=60.0):
+        self.max_inflight = max_inflight
+        self.queue_timeout = queue_timeout
+        self.call_timeout = call_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="model")
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """Take a model slot, waiting at most queue_timeout seconds."""
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded("model is busy, try again shortly")
+        with self._lock:
+            self.calls += 1
+
+    def release(self):
+        self._slots.release()
+
+    def submit(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = Future()
+            self._inflight[key] = future
+
+        try:
+            self.acquire()
+        except Overloaded as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            return future
+
+        def work():
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                self.release()
+                with self._lock:
+                    self._inflight.pop(key, None)
+
+        self._pool.submit(work)
+        return future
+
+    def call(self, key, fn):
+        """Run `fn` (or join an identical in-flight call) and wait for it."""
+        return self.submit(key, fn).result(timeout=self.call_timeout)
+
+    def stats(self):
+        return {
+            "max_inflight": self.max_inflight,
+            "inflight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+        }
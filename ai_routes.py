@@ -1,13 +1,20 @@
 from flask import Blueprint, Response, request, jsonify
-import google.generativeai as genai
 import os
-import requests
+import threading
+from concurrent.futures import TimeoutError as ModelTimeout
 from dotenv import load_dotenv
+from db import get_db, get_pool
+from ai_executor import ModelExecutor, Overloaded
+from geocode import Geocoder, RateLimited
+from llm_cache import PromptCache, make_key, replay_chunks
+from metrics import stats_collector, track_upstream
+from nearby import AGENT_K, AGENT_RADIUS_M, nearby_index
 
 load_dotenv()
 
-# Configure GenAI with API key
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY")) # Replace the API key with yours
+# GEMINI_API_ENDPOINT sends requests to another host over REST instead,
+# e.g. the local stub used by scripts/benchmark.py
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
 
 ai_bp = Blueprint("ai_bp", __name__)
 
@@ -15,29 +22,102 @@ ai_bp = Blueprint("ai_bp", __name__)
 # Set up separate models with different system roles
 MODEL_NAME = "gemini-1.5-flash"
 
-# 🧠 Chatbot Model (tourism expert)
-chat_model = genai.GenerativeModel(
-    model_name=MODEL_NAME,
-    system_instruction=(
-        "You are a tourism expert who looks forward to showing people famous destinations "
-        "around the world. You produce short yet concise responses (preferably 5 to 8 sentences), "
-        "and give an exciting and friendly vibe."
-    )
+CHAT_INSTRUCTION = (
+    "You are a tourism expert who looks forward to showing people famous destinations "
+    "around the world. You produce short yet concise responses (preferably 5 to 8 sentences), "
+    "and give an exciting and friendly vibe."
+)
+
+AGENT_INSTRUCTION = (
+    "You are an AI travel assistant that understands commands like "
+    "'fly to New York' or 'zoom on Tokyo'. "
+    "Respond only with a JSON object like: "
+    "{\"action\": \"fly\", \"place\": \"New York\"} "
+    "Supported actions: fly, travel, zoom. "
+    "DO NOT include any explanation or additional text outside the JSON."
 )
 
+# The Gemini SDK takes about a second to import, so it is loaded and the
+# models are built on first use; routes that never reach the model (and
+# cached answers) don't pay for it. warmup() does it ahead of time.
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(instruction):
+    model = _models.get(instruction)
+    if model is None:
+        with _models_lock:
+            model = _models.get(instruction)
+            if model is None:
+                import google.generativeai as genai
+
+                # Configure GenAI with API key
+                if GEMINI_API_ENDPOINT:
+                    genai.configure(api_key=os.getenv("GOOGLE_API_KEY", "stub"), transport="rest",
+                                    client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+                else:
+                    genai.configure(api_key=os.getenv("GOOGLE_API_KEY")) # Replace the API key with yours
+                model = genai.GenerativeModel(model_name=MODEL_NAME, system_instruction=instruction)
+                _models[instruction] = model
+    return model
+
+# 🧠 Chatbot Model (tourism expert)
+def chat_model():
+    return get_model(CHAT_INSTRUCTION)
+
 # 🛫 AI Agent Model (command interpreter) WORK IN PROGRESS
-agent_model = genai.GenerativeModel(
-    model_name=MODEL_NAME,
-    system_instruction=(
-        "You are an AI travel assistant that understands commands like "
-        "'fly to New York' or 'zoom on Tokyo'. "
-        "Respond only with a JSON object like: "
-        "{\"action\": \"fly\", \"place\": \"New York\"} "
-        "Supported actions: fly, travel, zoom. "
-        "DO NOT include any explanation or additional text outside the JSON."
-    )
+def agent_model():
+    return get_model(AGENT_INSTRUCTION)
+
+def warmup(background=False):
+    """Import the SDK and build both models now instead of on first request."""
+    if background:
+        threading.Thread(target=warmup, name="ai-warmup", daemon=True).start()
+        return
+    chat_model()
+    agent_model()
+
+# Model responses, cached in memory and in the prompt_cache table
+prompt_cache = PromptCache(
+    ttl=int(os.getenv("PROMPT_CACHE_TTL", 7 * 24 * 3600)),
+    memory_size=int(os.getenv("PROMPT_CACHE_MEMORY", 512)),
+    max_rows=int(os.getenv("PROMPT_CACHE_ROWS", 50000)),
+)
+
+# Upstream model calls: bounded concurrency, queue-wait timeout, and identical
+# concurrent prompts coalesced into one call
+model_executor = ModelExecutor(
+    max_inflight=int(os.getenv("AI_MAX_INFLIGHT", 8)),
+    queue_timeout=float(os.getenv("AI_QUEUE_TIMEOUT", 10)),
+    call_timeout=float(os.getenv("AI_CALL_TIMEOUT", 60)),
 )
 
+stats_collector.register("prompt_cache", prompt_cache.stats)
+stats_collector.register("model_executor", model_executor.stats)
+
+# Connections are borrowed only around cache reads and writes, never held
+# while waiting on the model, so slow upstream calls can't drain the pool
+def generate_cached(instruction, prompt):
+    key = make_key(prompt, MODEL_NAME, instruction)
+    with get_pool().connection() as conn:
+        text = prompt_cache.get(conn, key)
+    if text is not None:
+        return text
+
+    def generate():
+        with track_upstream("gemini"):
+            text = get_model(instruction).generate_content(prompt).text
+        with get_pool().connection() as conn:
+            prompt_cache.set(conn, key, text)
+        return text
+
+    return model_executor.call(key, generate)
+
+def busy_response(e):
+    if isinstance(e, Overloaded):
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    return jsonify({"error": "The model took too long to answer."}), 504
+
 
 # Ask Ai chatbot route.
 @ai_bp.route("/api/ask", methods=["POST"])
@@ -49,26 +129,22 @@ def ask():
         return jsonify({"error": "Prompt is required."}), 400
 
     try:
-        response = chat_model.generate_content(prompt)
-        return jsonify({"response": response.text})
+        text = generate_cached(CHAT_INSTRUCTION, prompt)
+        return jsonify({"response": text})
 
+    except (Overloaded, ModelTimeout) as e:
+        return busy_response(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
 
-# ✅ Simple geocoder to turn city names into lat/lon
+# ✅ Geocoder to turn city names into lat/lon: places table, local gazetteer
+# and on-disk cache first, rate-limited Nominatim only as a last resort
+geocoder = Geocoder()
+stats_collector.register("geocoder", lambda: geocoder.counts)
+
 def geocode_location(place):
-    try:
-        url = f"https://nominatim.openstreetmap.org/search"
-        params = {"q": place, "format": "json"}
-        res = requests.get(url, params=params, headers={"User-Agent": "AI-Agent"})
-        data = res.json()
-        if not data:
-            return None, None
-        return float(data[0]["lat"]), float(data[0]["lon"])
-    except Exception as e:
-        print("Geocoding failed:", e)
-        return None, None
+    return geocoder.geocode(get_pool(), place)
 
 # Agent AI model route
 @ai_bp.route("/agent", methods=["POST"])
@@ -80,9 +156,8 @@ def ai_agent():
         return jsonify({"error": "Prompt is required."}), 400
 
     try:
-        response = agent_model.generate_content(prompt)
+        output = generate_cached(AGENT_INSTRUCTION, prompt)
         # Expecting model to return something like: {action: "fly", place: "Tokyo"}
-        output = response.text
         print("🔍 AI Raw Output:", output)
 
         import re
@@ -96,21 +171,29 @@ def ai_agent():
             place = agent_data.get("place")
             action = agent_data.get("action")
             if not place or not action:
-                return jsonify({"response": response.text})
+                return jsonify({"response": output})
 
             lat, lon = geocode_location(place)
             if lat is None:
                 return jsonify({"error": f"Could not find location for {place}"}), 404
 
+            # Surrounding attractions so the globe can show them on arrival
+            nearby = nearby_index.query(get_db(), lat, lon, AGENT_K, AGENT_RADIUS_M)
+
             return jsonify({
                 "action": action.lower(),
                 "place": place,
                 "lat": lat,
-                "lon": lon
+                "lon": lon,
+                "nearby": nearby
             })
         else:
-            return jsonify({"response": response.text})
+            return jsonify({"response": output})
 
+    except (Overloaded, ModelTimeout) as e:
+        return busy_response(e)
+    except RateLimited as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -124,12 +207,37 @@ def ask_stream():
     if not prompt:
         return jsonify({"error": "Prompt is required."}), 400
 
+    # Cached answers are replayed as a stream; fresh ones are cached once
+    # the model finishes so a broken stream is never stored.
+    key = make_key(prompt, MODEL_NAME, CHAT_INSTRUCTION)
+    with get_pool().connection() as conn:
+        cached = prompt_cache.get(conn, key)
+    if cached is not None:
+        replay = (f"data: {piece}\n\n" for piece in replay_chunks(cached))
+        return Response(replay, mimetype="text/event-stream")
+
+    # A live stream holds a model slot until it finishes. The slot is taken
+    # inside the generator: a body that is never iterated (replaced by
+    # ?profile=1, or the client gone before the first chunk) never runs its
+    # finally, so it must not hold one.
     def stream():
         try:
-            chat = chat_model.start_chat()
-            for chunk in chat.send_message(prompt, stream=True):
-                yield f"data: {chunk.text}\n\n"
+            model_executor.acquire()
+        except Overloaded as e:
+            yield f"data: [Error: {str(e)}]\n\n"
+            return
+        try:
+            parts = []
+            chat = chat_model().start_chat()
+            with track_upstream("gemini_stream"):
+                for chunk in chat.send_message(prompt, stream=True):
+                    parts.append(chunk.text)
+                    yield f"data: {chunk.text}\n\n"
+            with get_pool().connection() as conn:
+                prompt_cache.set(conn, key, "".join(parts))
         except Exception as e:
             yield f"data: [Error: {str(e)}]\n\n"
+        finally:
+            model_executor.release()
 
     return Response(stream(), mimetype="text/event-stream")
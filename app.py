@@ -1,16 +1,60 @@
-from flask import Flask, g, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, Response
+import json
 import sqlite3
 import os
 from ai_routes import ai_bp
+from cache import SearchCache, current_generation
+from db import close_db, get_db, get_pool
+from distances import (DEFAULT_MODE, MAX_MATRIX_PLACES, MAX_PAIRS, SPEEDS_MPS, distance_store,
+                       estimates)
+from feed import (DEFAULT_PAGE_SIZE, LEGACY_FIELDS, MAX_PAGE_SIZE, PlaceFeed, feed_query,
+                  page_places, parse_fields)
+from fuzzy import fuzzy_index
+from metrics import metrics_bp, stats_collector
+from migrations import migrate
+from nearby import DEFAULT_K, MAX_K, nearby_index
+from paging import NDJSON, decode_cursor, stream_ndjson, wants_ndjson, with_next_cursor
+from routing import (DEFAULT_TIME_BUDGET, MAX_PLAN_PLACES, MAX_STOPS, MAX_TRIP_DAYS,
+                     clamp_budget, order_places, plan_days)
+from search_index import (DEFAULT_LIMIT, MAX_STREAM_LIMIT, SEARCH_COLUMNS, clamp_limit,
+                          search_places, search_query)
+from spatial import (CLUSTER_MAX_ZOOM, DEFAULT_VIEWPORT_LIMIT, MAX_VIEWPORT_LIMIT,
+                     parse_bbox, query_bbox, query_clusters, radius_bbox)
 from dotenv import load_dotenv
 load_dotenv()  
 
 app = Flask(__name__)
 app.config['TEMPLATES_AUTO_RELOAD'] = True
 app.secret_key = "super_secret_in_travelling_because_i_need_it_secure"
-DB_PATH = 'database.db'  
 app.register_blueprint(ai_bp)
+app.register_blueprint(metrics_bp)
+app.teardown_appcontext(close_db)
 app.config['CESIUM_TOKEN'] = os.getenv("CESIUM_TOKEN")
+
+# Search results cache; SEARCH_CACHE_WARM > 0 precomputes popular prefixes
+search_cache = SearchCache(
+    maxsize=int(os.getenv("SEARCH_CACHE_SIZE", 2048)),
+    ttl=int(os.getenv("SEARCH_CACHE_TTL", 300)),
+    warm_top=int(os.getenv("SEARCH_CACHE_WARM", 0)),
+)
+
+# Located places, materialized once per data generation for the globe feeds
+place_feed = PlaceFeed()
+
+# Cache and pool stats exported as gauges on /metrics
+stats_collector.register("search_cache", search_cache.stats)
+stats_collector.register("nearby_index", nearby_index.stats)
+stats_collector.register("fuzzy_index", fuzzy_index.stats)
+stats_collector.register("distance_store", distance_store.stats)
+stats_collector.register("db_pool", lambda: get_pool().stats())
+
+# Bring the schema up to date (see migrations.py)
+def init_db():
+    with get_pool().connection() as conn:
+        migrate(conn)
+
+init_db()
+
 # Signup route
 @app.route("/signup",methods=["GET","POST"])
 def signup():
@@ -19,7 +63,7 @@ def signup():
         email = request.form["email"]
         password = request.form["password"]
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         try:
             cursor.execute("INSERT INTO users (username, email, password) VALUES (?, ?, ?)",
@@ -28,9 +72,8 @@ def signup():
             flash("Account successfully created.", "success")
             return redirect(url_for("login"))
         except sqlite3.IntegrityError:
+            conn.rollback()
             flash("Username or email exists aready.", "danger")
-        finally:
-            conn.close()
     return render_template("signup.html")
 
 # Login Route
@@ -40,11 +83,10 @@ def login():
         username = request.form["username"]
         password = request.form["password"]
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM users WHERE username = ? AND password = ?", (username, password))
         user = cursor.fetchone()
-        conn.close()
 
         if user:
             session["user"] = username
@@ -73,94 +115,116 @@ def home():
 def test():
     return "Flask is working!"
 
-# Search route to search through database for locations
+# Search route to search through database for locations, e.g.
+#   /search?q=rom&category=&limit=50&fields=id,name,lat,lng
+# The next page is in the X-Next-Cursor / Link headers (?cursor=..);
+# format=ndjson streams one place per line instead of a JSON array.
+# When nothing matches exactly, the first page falls back to typo-tolerant
+# suggestions (see fuzzy.py), flagged with X-Search-Fuzzy: 1.
 @app.route("/search")
 def search():
     term = request.args.get("q", "").lower()
     category = request.args.get("category", "").lower()
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    try:
+        state = decode_cursor(request.args.get("cursor"))
+        offset = int(state.get("offset", request.args.get("offset", 0, type=int)))
+        fields = parse_fields(request.args.get("fields"), SEARCH_COLUMNS, SEARCH_COLUMNS)
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
 
     if not term:
         return jsonify([])
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Enables dict-style access
-    cursor = conn.cursor()
+    if wants_ndjson():
+        limit, offset = clamp_limit(limit, offset, MAX_STREAM_LIMIT)
+        query = search_query(term, category, limit, offset, fields)
+        if query is None:
+            return Response("", mimetype=NDJSON)
+        return stream_ndjson(get_pool(), *query, lambda row: dict(zip(fields, row)))
 
-    if category:
-        cursor.execute("""
-    SELECT id, name, city, image_url, description,
-           category, rating, lat, lng
-    FROM   places
-    WHERE  (LOWER(city) LIKE ? OR LOWER(name) LIKE ?)
-    AND    (? = '' OR LOWER(category) = ?)
-""", (f'%{term}%', f'%{term}%', category, category))
-    else:
-        cursor.execute("""
-            SELECT id, name, city, image_url, description, category, rating, lat, lng
-            FROM places
-            WHERE LOWER(city) LIKE ? OR LOWER(name) LIKE ?
-        """, (f"%{term}%", f"%{term}%"))
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    results = [{
-        "id": r["id"],
-        "name": r["name"],
-        "city": r["city"],
-        "image_url": r["image_url"],
-        "description": r["description"],
-        "category": r["category"],
-        "rating": r["rating"],
-        "lat": r["lat"],  
-        "lng": r["lng"]
-    } for r in rows]
-
-    return jsonify(results)
-
-def get_db():
-    if 'db' not in g:
-        g.db = sqlite3.connect(DB_PATH, timeout=5)
-        g.db.row_factory = sqlite3.Row
-    return g.db
-
-@app.teardown_appcontext
-def close_db(exc):
-    db = g.pop('db', None)
-    if db is not None:
-        db.close()
+    limit, offset = clamp_limit(limit, offset)
+    key = search_cache.make_key(term, category, limit, offset, fields)
+    conn = get_db()
+
+    def compute(key):
+        term, category, limit, offset, fields = key
+        places = search_places(conn, term, category, limit, offset, fields)
+        fuzzy = False
+        if not places and offset == 0:
+            places = fuzzy_index.search(conn, term, category, limit, fields)
+            fuzzy = bool(places)
+        return json.dumps(places), len(places), fuzzy
+
+    if search_cache.check_generation(current_generation(conn)):
+        search_cache.warm(compute)
+    cached = search_cache.get(key)
+    if cached is None:
+        cached = compute(key)
+        search_cache.set(key, cached)
+
+    body, count, fuzzy = cached
+    resp = Response(body, mimetype="application/json")
+    if fuzzy:
+        resp.headers["X-Search-Fuzzy"] = "1"
+        return resp
+    return with_next_cursor(resp, {"offset": offset + limit} if count == limit else None)
 
 # About page route
 @app.route("/about")
 def about():
     return render_template("aboutus.html")
 
-# search for places route
+# Serve one variant of the place feed with ETag revalidation and
+# pre-compressed bodies
+def feed_response(fmt, fields, mimetype="application/json"):
+    body = place_feed.get(get_db(), fmt, fields)
+    data, encoding, etag = body.pick(request.headers.get("Accept-Encoding"))
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(data, mimetype=mimetype)
+        if encoding:
+            resp.headers["Content-Encoding"] = encoding
+    resp.set_etag(etag)
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+# GeoJSON feed of every located place, e.g. /api/feed?fields=name,city
+@app.route("/api/feed")
+def place_feed_geojson():
+    try:
+        fields = parse_fields(request.args.get("fields"))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    return feed_response("geojson", fields, mimetype="application/geo+json")
+
+# Legacy list feeds. The whole cached feed by default (?fields= projects it);
+# with ?limit= or ?cursor= one page at a time, next page in X-Next-Cursor;
+# with format=ndjson streamed one place per line.
+def list_feed_response(lng_key):
+    try:
+        fields = parse_fields(request.args.get("fields"), LEGACY_FIELDS)
+        after = int(decode_cursor(request.args.get("cursor")).get("after", 0))
+    except (TypeError, ValueError) as e:
+        return jsonify(error=str(e)), 400
+    limit = request.args.get("limit", type=int)
+
+    if wants_ndjson():
+        sql, params, transform = feed_query(fields, lng_key, after, limit and max(1, limit))
+        return stream_ndjson(get_pool(), sql, params, transform)
+    if limit is None and "cursor" not in request.args:
+        return feed_response(lng_key, fields)
+
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    places, next_after = page_places(get_db(), fields, lng_key, after, limit)
+    return with_next_cursor(jsonify(places), None if next_after is None else {"after": next_after})
+
+# search for places route (legacy list feed with lat/lng keys)
 @app.route("/places")
 def get_gltf_places():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        SELECT name, city, description, lat, lng
-        FROM places
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-    """)
-
-    rows = cursor.fetchall()
-    conn.close()
-
-    return jsonify([
-        {
-            "name": row["name"],
-            "city": row["city"],
-            "description": row["description"],
-            "lat": row["lat"],
-            "lng": row["lng"],
-        }
-        for row in rows
-    ])
+    return list_feed_response("lng")
 
 
 # Welcome user
@@ -175,7 +239,7 @@ def profile():
         flash("Please log in to access your profile.", "warning")
         return redirect(url_for("login"))
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     username = session["user"]
 
@@ -192,15 +256,14 @@ def profile():
             """, (new_username, new_email, new_password, username))
             conn.commit()
             flash("Your changes were saved. Please log in again.", "info")
-            conn.close()
             session.pop("user", None)  # Log user out
             return redirect(url_for("login"))
         except sqlite3.IntegrityError:
+            conn.rollback()
             flash("That username or email is already taken.", "danger")
     else:
         cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
         user_data = cursor.fetchone()
-        conn.close()
 
         return render_template("profile.html", user={
             "username": user_data[1],
@@ -216,31 +279,64 @@ def globe():
 # API Route to return all locations with lat/lon (for Cesium globe)
 @app.route("/api/locations")
 def get_locations():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    return list_feed_response("lon")
+
+# Viewport API for the globe: only the places inside the visible area.
+#   /api/viewport?bbox=west,south,east,north&zoom=4
+#   /api/viewport?lat=48.85&lng=2.35&radius=5000
+# Below CLUSTER_MAX_ZOOM places are aggregated into grid clusters.
+@app.get("/api/viewport")
+def viewport():
+    zoom = request.args.get("zoom", type=int)
+    limit = request.args.get("limit", DEFAULT_VIEWPORT_LIMIT, type=int)
+    limit = max(1, min(limit, MAX_VIEWPORT_LIMIT))
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    radius = request.args.get("radius", type=float)
 
-    # Update this query if your table/column names differ
-    cursor.execute("""
-        SELECT name, city, description, lat, lng
-        FROM places
-        WHERE lat IS NOT NULL AND lng IS NOT NULL
-    """)
-    
-    rows = cursor.fetchall()
-    conn.close()
-
-    results = []
-    for row in rows:
-        results.append({
-            "name": row["name"],
-            "city": row["city"],
-            "description": row["description"],
-            "lat": row["lat"],
-            "lon": row["lng"],
-        })
+    try:
+        if request.args.get("bbox"):
+            bbox = parse_bbox(request.args["bbox"])
+        elif lat is not None and lng is not None and radius:
+            if not (-90 <= lat <= 90 and -180 <= lng <= 180 and radius > 0):
+                raise ValueError("center or radius out of range")
+            bbox = radius_bbox(lat, lng, radius)
+        else:
+            raise ValueError("bbox or lat, lng and radius are required")
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    conn = get_db()
+    if zoom is not None and zoom < CLUSTER_MAX_ZOOM:
+        clusters = query_clusters(conn, *bbox, zoom)
+        return jsonify(clustered=True, zoom=zoom, clusters=clusters)
 
-    return jsonify(results)
+    if request.args.get("bbox"):
+        places, truncated = query_bbox(conn, *bbox, limit)
+    else:
+        # Exact nearest-first from the KD-tree; a rating-capped bbox fetch
+        # would drop close, lower-rated places on dense data
+        places = nearby_index.query(conn, lat, lng, limit + 1, radius)
+        places, truncated = places[:limit], len(places) > limit
+    return jsonify(clustered=False, zoom=zoom, places=places, truncated=truncated)
+
+# k nearest places to a point, closest first, e.g.
+#   /api/nearby?lat=48.8584&lng=2.2945&k=10&radius=5000&category=museum
+@app.get("/api/nearby")
+def nearby():
+    lat = request.args.get("lat", type=float)
+    lng = request.args.get("lng", type=float)
+    k = max(1, min(request.args.get("k", DEFAULT_K, type=int), MAX_K))
+    radius = request.args.get("radius", type=float)
+    category = request.args.get("category", "").strip()
+
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify(error="lat and lng are required and must be in range"), 400
+    if radius is not None and radius <= 0:
+        return jsonify(error="radius must be positive"), 400
+
+    places = nearby_index.query(get_db(), lat, lng, k, radius, category or None)
+    return jsonify(lat=lat, lng=lng, places=places)
 
 # Select from favorites
 @app.route('/favorite/<place_id>', methods=['POST'])
@@ -249,7 +345,7 @@ def toggle_favorite(place_id):
         return jsonify({"error": "Unauthorized"}), 401
 
     username = session["user"]
-    conn = sqlite3.connect(DB_PATH, timeout=5)
+    conn = get_db()
     cur  = conn.cursor()
 
     try:
@@ -271,8 +367,6 @@ def toggle_favorite(place_id):
         conn.rollback()
         print("DB error:", e)
         return jsonify({"error": "DB write failed"}), 500
-    finally:
-        conn.close()
 
     return jsonify({"status": status})
 
@@ -291,7 +385,7 @@ def show_favorites():
         SELECT p.id, p.name, p.city, p.image_url, p.description,
                p.category, p.rating, p.lat, p.lng
         FROM   favorites f
-        JOIN   places    p ON f.place_id = p.id
+        JOIN   places    p ON p.id = CAST(f.place_id AS TEXT)   -- place_id is INTEGER, id TEXT
         WHERE  f.username = ?
     """, (username,))
     favorites = cur.fetchall()
@@ -305,6 +399,14 @@ def itinerary():
 # ▼ ADD this right after your `@app.route("/")` home view
 from datetime import datetime, timedelta
 
+# Every date from start to end, inclusive
+def trip_dates(start, end):
+    start = datetime.fromisoformat(start)
+    end   = datetime.fromisoformat(end)
+    if start > end:
+        raise ValueError("Start after end")
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
 @app.route("/tripplan", methods=["GET", "POST"])
 def tripplan():
     if "user" not in session:           
@@ -314,14 +416,7 @@ def tripplan():
     days = []                            
     if request.method == "POST":
         try:
-            start = datetime.fromisoformat(request.form["start"])
-            end   = datetime.fromisoformat(request.form["end"])
-            if start > end:
-                raise ValueError("Start after end")
-
-            delta = (end - start).days + 1          # inclusive
-            for i in range(delta):
-                d = start + timedelta(days=i)
+            for d in trip_dates(request.form["start"], request.form["end"]):
                 days.append({
                     "label": d.strftime("%A – %b %d %Y"),  # e.g. Monday – Jul 01 2025
                     "iso":   d.date().isoformat()          # 2025‑07‑01
@@ -349,7 +444,7 @@ def trip_days(trip_id):
         JOIN places p ON td.place_id = p.id
         JOIN trips t ON td.trip_id = t.id
         WHERE td.trip_id = ? AND t.username = ?
-        ORDER BY td.trip_date
+        ORDER BY td.trip_date, td.pos
     """, (trip_id, session["user"])).fetchall()
 
     # Group by day
@@ -395,8 +490,7 @@ def delete_trip(trip_id):
         if not trip_check:
             return jsonify(error="not found or unauthorized"), 403
 
-        # Delete from trip_days first (FK constraint)
-        cur.execute("DELETE FROM trip_days WHERE trip_id = ?", (trip_id,))
+        # trip_days rows go with it (ON DELETE CASCADE)
         cur.execute("DELETE FROM trips WHERE id = ?", (trip_id,))
         db.commit()
         return jsonify(ok=True)
@@ -404,6 +498,14 @@ def delete_trip(trip_id):
         db.rollback()
         return jsonify(error=str(e)), 500
 
+# One trip_days row per stop, with pos following the order in the payload
+def trip_day_rows(trip_id, days):
+    return [
+        (trip_id, day["date"], str(pid), pos)
+        for day in days
+        for pos, pid in enumerate(day["places"])
+    ]
+
 # Trip saver
 @app.post("/api/save_trip")
 def save_trip():
@@ -430,14 +532,11 @@ def save_trip():
         """, (session["user"], title, start, end))
         trip_id = cur.lastrowid
 
-        # Insert each day's selected place_ids into trip_days
-        for day in days:
-            date = day["date"]
-            for pid in day["places"]:
-                cur.execute("""
-                    INSERT INTO trip_days (trip_id, trip_date, place_id)
-                    VALUES (?, ?, ?)
-                """, (trip_id, date, pid))
+        # Insert every day's selected place_ids into trip_days in one batch
+        cur.executemany("""
+            INSERT INTO trip_days (trip_id, trip_date, place_id, pos)
+            VALUES (?, ?, ?, ?)
+        """, trip_day_rows(trip_id, days))
 
         db.commit()
         return jsonify(ok=True, trip_id=trip_id)
@@ -445,6 +544,206 @@ def save_trip():
         db.rollback()
         return jsonify(error=str(e)), 500
 
+# Trip editor: rewrites only the days whose stops changed, e.g.
+#   PUT /api/update_trip/7  {"title": .., "start": .., "end": ..,
+#                            "days": [{"date": "2025-07-01", "places": [..]}]}
+# Days missing from the payload are removed; title/start/end are optional.
+@app.put("/api/update_trip/<int:trip_id>")
+def update_trip(trip_id):
+    if "user" not in session:
+        return jsonify(error="unauthorized"), 401
+
+    data = request.get_json() or {}
+    days = data.get("days")
+    if days is None:
+        return jsonify(error="Missing trip days"), 400
+
+    db = get_db()
+    try:
+        trip = db.execute("SELECT title, start, end FROM trips WHERE id = ? AND username = ?",
+                          (trip_id, session["user"])).fetchone()
+        if not trip:
+            return jsonify(error="not found or unauthorized"), 403
+
+        title = data.get("title") or trip["title"]
+        start = data.get("start") or trip["start"]
+        end = data.get("end") or trip["end"]
+        if not all(isinstance(v, str) for v in (title, start, end)):
+            return jsonify(error="title, start and end must be strings"), 400
+        title = title.strip()
+        try:
+            if datetime.fromisoformat(start) > datetime.fromisoformat(end):
+                raise ValueError("Start after end")
+        except ValueError:
+            return jsonify(error="Invalid dates selected"), 400
+        if (title, start, end) != (trip["title"], trip["start"], trip["end"]):
+            db.execute("UPDATE trips SET title = ?, start = ?, end = ? WHERE id = ?",
+                       (title, start, end, trip_id))
+
+        current = {}
+        for row in db.execute("""
+            SELECT trip_date, place_id FROM trip_days
+            WHERE trip_id = ? ORDER BY trip_date, pos
+        """, (trip_id,)):
+            current.setdefault(row["trip_date"], []).append(row["place_id"])
+
+        wanted = {day["date"]: [str(pid) for pid in day["places"]] for day in days}
+        changed = [date for date, places in wanted.items() if current.get(date) != places]
+        removed = [date for date in current if date not in wanted]
+
+        stale = changed + removed
+        if stale:
+            db.executemany("DELETE FROM trip_days WHERE trip_id = ? AND trip_date = ?",
+                           [(trip_id, date) for date in stale])
+        db.executemany("""
+            INSERT INTO trip_days (trip_id, trip_date, place_id, pos)
+            VALUES (?, ?, ?, ?)
+        """, trip_day_rows(trip_id, [{"date": d, "places": wanted[d]} for d in changed]))
+
+        db.commit()
+        return jsonify(ok=True, trip_id=trip_id, changed_days=changed, removed_days=removed)
+    except (KeyError, TypeError) as e:
+        db.rollback()
+        return jsonify(error=f"Malformed trip days: {e}"), 400
+    except sqlite3.Error as e:
+        db.rollback()
+        return jsonify(error=str(e)), 500
+
+# Route optimizer preview: best visiting order for one day's stops, e.g.
+#   POST /api/optimize_route {"places": ["123", "456", ..], "fixed_start": true}
+# fixed_start keeps the first stop first (e.g. the hotel).
+@app.post("/api/optimize_route")
+def optimize_route():
+    data = request.get_json() or {}
+    places = data.get("places") or []
+    if not isinstance(places, list):
+        return jsonify(error="places must be a list of place ids"), 400
+    if len(places) > MAX_STOPS:
+        return jsonify(error=f"at most {MAX_STOPS} places per day"), 400
+
+    result = order_places(get_db(), places, bool(data.get("fixed_start")),
+                          clamp_budget(data.get("time_budget", DEFAULT_TIME_BUDGET)))
+    return jsonify(result)
+
+# Auto-planner: split places over the trip's days and order each day, e.g.
+#   POST /api/plan_trip {"start": "2025-07-01", "end": "2025-07-03", "places": [..]}
+# Returns {"days": [{"date": .., "places": [..]}, ..]} ready for /api/save_trip.
+@app.post("/api/plan_trip")
+def plan_trip():
+    data = request.get_json() or {}
+    places = data.get("places") or []
+    if not isinstance(places, list):
+        return jsonify(error="places must be a list of place ids"), 400
+    if len(places) > MAX_PLAN_PLACES:
+        return jsonify(error=f"at most {MAX_PLAN_PLACES} places per plan"), 400
+    try:
+        dates = trip_dates(data.get("start") or "", data.get("end") or "")
+    except (TypeError, ValueError):
+        return jsonify(error="Invalid dates selected"), 400
+    if len(dates) > MAX_TRIP_DAYS:
+        return jsonify(error=f"at most {MAX_TRIP_DAYS} days per trip"), 400
+
+    result = plan_days(get_db(), places, [d.date().isoformat() for d in dates],
+                       clamp_budget(data.get("time_budget", DEFAULT_TIME_BUDGET)))
+    return jsonify(start=dates[0].date().isoformat(), end=dates[-1].date().isoformat(), **result)
+
+# Reorder a saved trip's days in place by rewriting trip_days.pos, e.g.
+#   POST /api/optimize_trip/7 {"date": "2025-07-01"}   (omit date for every day)
+@app.post("/api/optimize_trip/<int:trip_id>")
+def optimize_trip(trip_id):
+    if "user" not in session:
+        return jsonify(error="unauthorized"), 401
+
+    data = request.get_json(silent=True) or {}
+    fixed_start = bool(data.get("fixed_start"))
+    budget = clamp_budget(data.get("time_budget", DEFAULT_TIME_BUDGET))
+
+    db = get_db()
+    try:
+        if not db.execute("SELECT id FROM trips WHERE id = ? AND username = ?",
+                          (trip_id, session["user"])).fetchone():
+            return jsonify(error="not found or unauthorized"), 403
+
+        days = {}
+        for row in db.execute("""
+            SELECT id, trip_date, place_id FROM trip_days
+            WHERE trip_id = ? AND (? IS NULL OR trip_date = ?)
+            ORDER BY trip_date, pos
+        """, (trip_id, data.get("date"), data.get("date"))):
+            days.setdefault(row["trip_date"], []).append((row["id"], row["place_id"]))
+
+        results, updates = [], []
+        for date, stops in days.items():
+            result = order_places(db, [pid for _, pid in stops[:MAX_STOPS]], fixed_start, budget)
+            # Map the new order back onto row ids (a place can appear twice)
+            row_ids = {}
+            for row_id, pid in stops:
+                row_ids.setdefault(pid, []).append(row_id)
+            ordered = [row_ids[pid].pop(0) for pid in result["places"]]
+            ordered += [row_id for ids in row_ids.values() for row_id in ids]
+            updates.extend((pos, row_id) for pos, row_id in enumerate(ordered))
+            results.append({"date": date, **result})
+
+        db.executemany("UPDATE trip_days SET pos = ? WHERE id = ?", updates)
+        db.commit()
+        return jsonify(ok=True, trip_id=trip_id, days=results)
+    except sqlite3.Error as e:
+        db.rollback()
+        return jsonify(error=str(e)), 500
+
+# Distance and travel-time estimates between places (see distances.py), e.g.
+#   POST /api/distances {"places": ["123", "456", ..], "mode": "walk"}   (matrix)
+#   POST /api/distances {"pairs": [["123", "456"], ..]}                  (one per pair)
+@app.post("/api/distances")
+def place_distances():
+    data = request.get_json(silent=True) or {}
+    mode = data.get("mode") or DEFAULT_MODE
+    if mode not in SPEEDS_MPS:
+        return jsonify(error=f"mode must be one of: {', '.join(SPEEDS_MPS)}"), 400
+
+    if "pairs" in data:
+        pairs = data["pairs"]
+        if not isinstance(pairs, list) or not all(isinstance(p, list) and len(p) == 2 for p in pairs):
+            return jsonify(error="pairs must be a list of [from, to] place ids"), 400
+        if len(pairs) > MAX_PAIRS:
+            return jsonify(error=f"at most {MAX_PAIRS} pairs"), 400
+        metres, seconds = estimates(distance_store.pairs(get_db(), pairs), mode)
+        return jsonify(mode=mode, pairs=[
+            {"from": a, "to": b, "distance_m": m, "travel_s": s}
+            for (a, b), m, s in zip(pairs, metres, seconds)
+        ])
+
+    places = data.get("places") or []
+    if not isinstance(places, list):
+        return jsonify(error="places must be a list of place ids"), 400
+    if len(places) > MAX_MATRIX_PLACES:
+        return jsonify(error=f"at most {MAX_MATRIX_PLACES} places per matrix"), 400
+    located, unlocated, dist = distance_store.matrix(get_db(), places)
+    metres, seconds = estimates(dist, mode)
+    return jsonify(mode=mode, places=located, unlocated=unlocated,
+                   distance_m=metres, travel_s=seconds)
+
+# Nearest places in the same city from the precomputed store, e.g.
+#   /api/distances/123/neighbours?k=5&mode=walk
+@app.get("/api/distances/<place_id>/neighbours")
+def place_neighbours(place_id):
+    mode = request.args.get("mode") or DEFAULT_MODE
+    if mode not in SPEEDS_MPS:
+        return jsonify(error=f"mode must be one of: {', '.join(SPEEDS_MPS)}"), 400
+    k = request.args.get("k", type=int)
+    table = distance_store.current()
+    if table is None:
+        return jsonify(error="distance store not built yet"), 503
+    hits = table.neighbours_of(place_id, None if k is None else max(1, k))
+    if hits is None:
+        return jsonify(error="place not found"), 404
+
+    metres, seconds = estimates([m for _, m in hits], mode)
+    return jsonify(place=place_id, mode=mode,
+                   stale=distance_store.fresh(get_db()) is None,
+                   neighbours=[{"id": pid, "distance_m": m, "travel_s": s}
+                               for (pid, _), m, s in zip(hits, metres, seconds)])
+
 
 # Digital Twin Cesium Route
 @app.route("/digital_twin")
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# Data generation counter: bumped by triggers on every write to places, so any
+# process (the app, scripts/ingest.py, a sqlite shell) invalidates caches that
+# were built from an older snapshot of the table.
+GENERATION_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS app_meta (
+        key   TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "INSERT OR IGNORE INTO app_meta (key, value) VALUES ('places_generation', 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS places_gen_ai AFTER INSERT ON places BEGIN
+        UPDATE app_meta SET value = value + 1 WHERE key = 'places_generation';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_gen_ad AFTER DELETE ON places BEGIN
+        UPDATE app_meta SET value = value + 1 WHERE key = 'places_generation';
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_gen_au AFTER UPDATE ON places BEGIN
+        UPDATE app_meta SET value = value + 1 WHERE key = 'places_generation';
+    END
+    """,
+]
+
+
+def ensure_generation_counter(conn):
+    for stmt in GENERATION_SCHEMA:
+        conn.execute(stmt)
+    conn.commit()
+
+
+def current_generation(conn):
+    row = conn.execute(
+        "SELECT value FROM app_meta WHERE key = 'places_generation'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_generation(conn):
+    conn.execute(
+        "UPDATE app_meta SET value = value + 1 WHERE key = 'places_generation'"
+    )
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def keys(self):
+        """Current keys, least recently used first (expired ones included)."""
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+
+class SearchCache:
+    """Search results keyed on the normalized query, dropped on data changes.
+
+    Values are (serialized JSON body, row count, fuzzy fallback used), so a
+    hit skips both the query and the re-serialization. With `warm_top` > 0 every prefix of the
+    most popular queries is recomputed as soon as a new generation is seen,
+    which keeps type-ahead hot right after an ingest.
+    """
+
+    def __init__(self, maxsize=2048, ttl=300, warm_top=0, max_tracked=10000):
+        self.cache = TTLCache(maxsize, ttl)
+        self.warm_top = warm_top
+        self.max_tracked = max_tracked
+        self.generation = None
+        self.popular = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(term, category="", limit=None, offset=0, fields=None):
+        term = " ".join(term.lower().split())
+        return (term, (category or "").strip().lower(), limit, offset, fields)
+
+    def check_generation(self, generation):
+        # Returns True when the cache was just invalidated
+        with self._lock:
+            if generation == self.generation:
+                return False
+            self.generation = generation
+        self.cache.clear()
+        return True
+
+    def get(self, key):
+        self._track(key)
+        return self.cache.get(key)
+
+    def set(self, key, body):
+        self.cache.set(key, body)
+
+    def _track(self, key):
+        with self._lock:
+            self.popular[key] += 1
+            if len(self.popular) > self.max_tracked:
+                self.popular = Counter(dict(self.popular.most_common(self.max_tracked // 2)))
+
+    def warm(self, compute):
+        """Precompute every prefix of the `warm_top` most popular queries.
+
+        `compute(key)` must return the cached value for a key.
+        """
+        if not self.warm_top:
+            return 0
+        with self._lock:
+            top = [key for key, _ in self.popular.most_common(self.warm_top)]
+        keys = set()
+        for term, *rest in top:
+            for end in range(2, len(term) + 1):
+                keys.add((term[:end].rstrip(), *rest))
+        for key in keys:
+            if key[0]:
+                self.cache.set(key, compute(key))
+        return len(keys)
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats["generation"] = self.generation
+        return stats
@@ -0,0 +1,153 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+from flask import g
+
+from metrics import TimedConnection
+
+load_dotenv()
+
+DB_PATH = os.getenv("DB_PATH", "database.db")
+
+# Per-connection tuning: WAL lets readers run alongside the single writer,
+# NORMAL sync is safe under WAL, and mmap avoids read() copies for hot pages.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    pass
+
+
+def connect(path=DB_PATH, timeout=5.0, cached_statements=256):
+    # check_same_thread is off because pooled connections move between
+    # request threads; the pool guarantees one user at a time.
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False,
+                           cached_statements=cached_statements, factory=TimedConnection)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """Fixed-size pool of pre-opened SQLite connections."""
+
+    def __init__(self, path=DB_PATH, size=8, timeout=5.0, cached_statements=256):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        for _ in range(size):
+            self._idle.put(connect(path, timeout, cached_statements))
+
+    def acquire(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                conn = self._idle.get(timeout=self.timeout if timeout is None else timeout)
+            except queue.Empty:
+                with self._lock:
+                    self.timeouts += 1
+                raise PoolTimeout("timed out waiting for a database connection")
+            waited = time.perf_counter() - start
+            with self._lock:
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait = max(self.max_wait, waited)
+        with self._lock:
+            self.acquired += 1
+        return conn
+
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close the idle connections (call with none borrowed)."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def stats(self):
+        idle = self._idle.qsize()
+        return {
+            "size": self.size,
+            "idle": idle,
+            "in_use": self.size - idle,
+            "acquired": self.acquired,
+            "waits": self.waits,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": self.wait_time,
+            "wait_seconds_max": self.max_wait,
+        }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # One pool per process; connections must not be shared across a fork
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ConnectionPool(DB_PATH, size=int(os.getenv("DB_POOL_SIZE", 8)))
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def close_pool():
+    # Called before forking workers (see wsgi.py): SQLite handles must not
+    # cross a fork, and closing inherited ones in a child drops the
+    # parent's POSIX locks
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+
+# Request-scoped connection, returned to the pool on app context teardown
+def get_db():
+    if 'db' not in g:
+        g.db = get_pool().acquire()
+    return g.db
+
+
+def close_db(exc=None):
+    db = g.pop('db', None)
+    if db is not None:
+        get_pool().release(db)
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from cache import current_generation
+from db import DB_PATH
+from spatial import EARTH_RADIUS_M
+
+# Place-to-place distances and travel-time estimates.
+#
+# scripts/build_distances.py writes a snapshot of every located place to
+# DISTANCE_STORE_DIR/<build>/ and points DISTANCE_STORE_DIR/CURRENT at it:
+#
+#   ids.npy          place ids (utf-8 bytes), sorted
+#   coords.npy       (n, 2) float64 lat, lng, in id order
+#   neighbours.npy   (n, k) int32 nearest places in the same city, -1 padded
+#   neighbour_m.npy  (n, k) float32 great-circle metres to them
+#   meta.json        places generation the build was made from, k
+#
+# Workers memory-map the arrays read-only, so they share the page cache and
+# nothing is copied. While the snapshot matches the current places generation
+# coordinates come from it rather than from SQLite; any pair not in the
+# neighbour lists is computed from those coordinates, vectorized.
+
+DISTANCE_STORE_DIR = os.getenv("DISTANCE_STORE_DIR",
+                               os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), "distances"))
+
+# No road network: travel time is the great-circle distance stretched by a
+# typical street-grid detour, at a fixed speed per mode
+DETOUR_FACTOR = 1.3
+SPEEDS_MPS = {"walk": 1.4, "bike": 4.2, "drive": 8.3}
+DEFAULT_MODE = "walk"
+MAX_MATRIX_PLACES = 200
+MAX_PAIRS = 10000
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle metres between arrays of points (broadcasting)."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def distance_matrix(lats, lngs):
+    """Pairwise great-circle distances in metres as an (n, n) array."""
+    lat = np.asarray(lats, dtype=float)
+    lng = np.asarray(lngs, dtype=float)
+    return haversine(lat[:, None], lng[:, None], lat[None, :], lng[None, :])
+
+
+def travel_seconds(metres, mode=DEFAULT_MODE):
+    return np.asarray(metres) * DETOUR_FACTOR / SPEEDS_MPS[mode]
+
+
+def estimates(metres, mode=DEFAULT_MODE):
+    """JSON-ready (metres, seconds) nested lists; NaN (unlocated) becomes None."""
+    metres = np.asarray(metres, dtype=float)
+
+    def rounded(values, digits):
+        out = np.round(values, digits).astype(object)
+        out[np.isnan(values)] = None
+        return out.tolist()
+
+    return rounded(metres, 1), rounded(travel_seconds(metres, mode), 0)
+
+
+def place_coords(conn, place_ids):
+    """{place id: (lat, lng)} for the ids that have coordinates."""
+    ids = list(set(place_ids))
+    coords = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        for row in conn.execute(f"""
+            SELECT id, lat, lng FROM places
+            WHERE id IN ({marks}) AND lat IS NOT NULL AND lng IS NOT NULL
+        """, chunk):
+            coords[str(row[0])] = (row[1], row[2])
+    return coords
+
+
+class DistanceTable:
+    """One build of the store, memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode="r")
+        self.ids = load("ids.npy")
+        self.coords = load("coords.npy")
+        self.neighbours = load("neighbours.npy")
+        self.neighbour_m = load("neighbour_m.npy")
+
+    def positions(self, place_ids):
+        """Row of each id in the arrays, -1 where it isn't in this build."""
+        keys = [str(pid).encode() for pid in place_ids]
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if not keys or not len(self.ids):
+            return rows
+        width = self.ids.dtype.itemsize
+        probe = np.array([k[:width] for k in keys], dtype=self.ids.dtype)
+        found = np.minimum(np.searchsorted(self.ids, probe), len(self.ids) - 1)
+        hit = (self.ids[found] == probe) & np.array([len(k) <= width for k in keys])
+        rows[hit] = found[hit]
+        return rows
+
+    def place_coords(self, place_ids):
+        place_ids = [str(pid) for pid in place_ids]
+        rows = self.positions(place_ids)
+        found = [pid for pid, row in zip(place_ids, rows) if row >= 0]
+        return dict(zip(found, map(tuple, self.coords[rows[rows >= 0]].tolist())))
+
+    def neighbours_of(self, place_id, k=None):
+        """[(place id, metres)] for the nearest places in the same city."""
+        row = self.positions([place_id])[0]
+        if row < 0:
+            return None
+        cols = self.neighbours[row][:k]
+        metres = self.neighbour_m[row][:k]
+        keep = cols >= 0
+        return [(self.ids[c].decode(), float(m)) for c, m in zip(cols[keep], metres[keep])]
+
+
+class DistanceStore:
+    """Distances between places, from the precomputed build when it is
+    current and from the places table otherwise."""
+
+    def __init__(self, root=DISTANCE_STORE_DIR):
+        self.root = root
+        self.table = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        """The live DistanceTable, reopened when a new build is published;
+        None until scripts/build_distances.py has run."""
+        try:
+            with open(os.path.join(self.root, "CURRENT")) as f:
+                build = f.read().strip()
+        except FileNotFoundError:
+            return None
+        table = self.table
+        if table is None or os.path.basename(table.path) != build:
+            with self._lock:
+                table = self.table
+                if table is None or os.path.basename(table.path) != build:
+                    try:
+                        table = self.table = DistanceTable(os.path.join(self.root, build))
+                    except (OSError, ValueError) as e:
+                        print(f"⚠️ Could not open distance store {build}: {e}")
+                        return None
+        return table
+
+    def fresh(self, conn):
+        """The live table if it was built from the current places data."""
+        table = self.current()
+        if table is not None and table.meta.get("generation") == current_generation(conn):
+            return table
+        return None
+
+    def coords(self, conn, place_ids):
+        """{place id: (lat, lng)} for the ids that have coordinates."""
+        table = self.fresh(conn)
+        if table is None:
+            return place_coords(conn, place_ids)
+        return table.place_coords(place_ids)
+
+    def matrix(self, conn, place_ids):
+        """(located ids, unlocated ids, (n, n) metres between the located)."""
+        place_ids = list(dict.fromkeys(str(pid) for pid in place_ids))
+        coords = self.coords(conn, place_ids)
+        located = [pid for pid in place_ids if pid in coords]
+        dist = distance_matrix([coords[p][0] for p in located], [coords[p][1] for p in located])
+        return located, [pid for pid in place_ids if pid not in coords], dist
+
+    def pairs(self, conn, pairs):
+        """Metres for each (from id, to id) pair, NaN where either is unlocated."""
+        pairs = [(str(a), str(b)) for a, b in pairs]
+        coords = self.coords(conn, {pid for pair in pairs for pid in pair})
+        nowhere = (np.nan, np.nan)
+        start = np.array([coords.get(a, nowhere) for a, _ in pairs], dtype=float).reshape(-1, 2)
+        end = np.array([coords.get(b, nowhere) for _, b in pairs], dtype=float).reshape(-1, 2)
+        return haversine(start[:, 0], start[:, 1], end[:, 0], end[:, 1])
+
+    def stats(self):
+        table = self.table
+        if table is None:
+            return {"places": 0}
+        return {"places": len(table.ids), "k": table.neighbours.shape[1],
+                "generation": table.meta.get("generation")}
+
+
+# Shared by the route optimizer and the /api/distances routes
+distance_store = DistanceStore()
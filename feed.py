@@ -0,0 +1,179 @@
+import gzip
+import hashlib
+import json
+import sqlite3
+import threading
+
+from cache import TTLCache, current_generation
+from db import DB_PATH, connect
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+# Properties a client may project with ?fields=; lat/lng are always sent
+FEED_FIELDS = ("id", "name", "city", "description", "category", "rating", "image_url")
+LEGACY_FIELDS = ("name", "city", "description")
+
+
+class FeedBody:
+    """One serialized feed variant with its pre-compressed encodings."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.etag = hashlib.sha256(raw).hexdigest()[:32]
+        self.encoded = {"gzip": gzip.compress(raw, compresslevel=6)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(raw, quality=9)
+
+    def pick(self, accept_encoding):
+        """Return (body, content_encoding, etag) for an Accept-Encoding header.
+
+        Each encoding gets its own strong ETag since the bytes differ.
+        """
+        accepted = {part.split(";")[0].strip() for part in (accept_encoding or "").split(",")}
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.encoded:
+                return self.encoded[encoding], encoding, f"{self.etag}-{encoding}"
+        return self.raw, None, self.etag
+
+
+def parse_fields(value, default=FEED_FIELDS, allowed=FEED_FIELDS):
+    if not value:
+        return tuple(default)
+    wanted = {f.strip() for f in value.split(",")}
+    unknown = wanted - set(allowed) - {"lat", "lng"}
+    if unknown:
+        raise ValueError("unknown fields: " + ", ".join(sorted(unknown)))
+    return tuple(f for f in allowed if f in wanted)
+
+
+class PlaceFeed:
+    """Every located place, materialized once per data generation.
+
+    The row snapshot and each requested (format, fields) serialization are
+    kept until the places generation changes, so repeat globe loads only cost
+    a generation lookup and, with a matching ETag, not even a body.
+
+    After a change the snapshot and the variants in use are rebuilt in a
+    background thread while the previous ones keep being served. Every
+    variant is a full copy of the feed (plus its compressed encodings), so
+    only a few of the most recently used are kept.
+    """
+
+    def __init__(self, max_variants=6, path=DB_PATH):
+        self.path = path
+        self.generation = None
+        self.rows = None
+        self.variants = TTLCache(maxsize=max_variants, ttl=float("inf"))
+        self.rebuilding = False
+        self._lock = threading.Lock()
+
+    def _load(self, conn):
+        columns = ", ".join(FEED_FIELDS)
+        rows = conn.execute(f"""
+            SELECT {columns}, lat, lng
+            FROM places
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+        """).fetchall()
+        return [dict(zip(FEED_FIELDS + ("lat", "lng"), row)) for row in rows]
+
+    @staticmethod
+    def _serialize(rows, fmt, fields):
+        if fmt == "geojson":
+            doc = {
+                "type": "FeatureCollection",
+                "features": [{
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [r["lng"], r["lat"]]},
+                    "properties": {f: r[f] for f in fields},
+                } for r in rows],
+            }
+        else:
+            lng_key = "lon" if fmt == "lon" else "lng"
+            doc = []
+            for r in rows:
+                item = {f: r[f] for f in fields}
+                item["lat"] = r["lat"]
+                item[lng_key] = r["lng"]
+                doc.append(item)
+        return json.dumps(doc, separators=(",", ":")).encode()
+
+    def get(self, conn, fmt="geojson", fields=FEED_FIELDS):
+        generation = current_generation(conn)
+        key = (fmt, tuple(fields))
+        with self._lock:
+            if self.rows is None:   # first load, normally during preload
+                self.rows = self._load(conn)
+                self.generation = generation
+            elif generation != self.generation and not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self._rebuild, name="place-feed", daemon=True).start()
+            rows, variants = self.rows, self.variants
+        body = variants.get(key)
+        if body is None:
+            # Outside the lock: other variants keep being served meanwhile
+            body = FeedBody(self._serialize(rows, fmt, fields))
+            with self._lock:
+                if self.variants is variants:
+                    variants.set(key, body)
+        return body
+
+    def _rebuild(self):
+        conn = connect(self.path)
+        try:
+            # Generation and rows from one read, so the pair stays consistent
+            conn.execute("BEGIN")
+            generation = current_generation(conn)
+            rows = self._load(conn)
+            conn.rollback()
+            variants = TTLCache(maxsize=self.variants.maxsize, ttl=float("inf"))
+            for fmt, fields in self.variants.keys():
+                variants.set((fmt, fields), FeedBody(self._serialize(rows, fmt, fields)))
+            with self._lock:
+                self.rows, self.generation, self.variants = rows, generation, variants
+        except sqlite3.Error as e:
+            print("Place feed rebuild failed:", e)
+        finally:
+            conn.close()
+            with self._lock:
+                self.rebuilding = False
+
+
+# Paged and streamed variants of the list feeds, read straight from the
+# table in rowid order so each page is an index range scan
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+
+def feed_query(fields, lng_key="lng", after=0, limit=None):
+    """(sql, params, transform) for located places past rowid `after`."""
+    columns = ", ".join(("rowid",) + tuple(fields) + ("lat", "lng"))
+    sql = f"""
+        SELECT {columns} FROM places
+        WHERE rowid > ? AND lat IS NOT NULL AND lng IS NOT NULL
+        ORDER BY rowid
+    """
+    params = [after]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    def transform(row):
+        item = dict(zip(fields, row[1:-2]))
+        item["lat"] = row[-2]
+        item[lng_key] = row[-1]
+        return item
+
+    return sql, params, transform
+
+
+def page_places(conn, fields, lng_key="lng", after=0, limit=DEFAULT_PAGE_SIZE):
+    """One page of the list feed; returns (items, rowid to continue after or None)."""
+    sql, params, transform = feed_query(fields, lng_key, after, limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return [transform(row) for row in rows], (rows[-1][0] if more else None)
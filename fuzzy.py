@@ -0,0 +1,221 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+
+from cache import current_generation
+from db import DB_PATH, connect
+from search_index import BM25_WEIGHTS, DEFAULT_LIMIT, SEARCH_COLUMNS
+
+# Typo-tolerant fallback for /search. The words of every place name and city
+# (the FTS vocabulary, so the index stays small however many places there
+# are) are indexed by their trigrams; each query word is swapped for the
+# closest real words and the FTS query is rerun with those.
+
+VOCAB_SCHEMA = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS places_fts_terms
+    USING fts5vocab(places_fts, 'col')
+"""
+
+MIN_SIMILARITY = 0.3      # trigram Jaccard similarity (pg_trgm's default threshold)
+TERMS_PER_WORD = 5        # closest vocabulary words tried for each query word
+MIN_WORD_LENGTH = 3       # shorter words are only prefix-matched
+MAX_WORDS = 6
+CANDIDATES = 200          # FTS matches reranked by similarity to the whole query
+FUZZY_BUDGET_MS = float(os.getenv("FUZZY_BUDGET_MS", 50))
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Letters NFKD leaves alone (the FTS tokenizer keeps "cœur" as is too)
+_FOLD = str.maketrans({"œ": "oe", "æ": "ae", "ø": "o", "ł": "l", "đ": "d", "ð": "d",
+                       "þ": "th", "ı": "i"})
+
+
+def ensure_fuzzy_vocab(conn):
+    conn.execute(VOCAB_SCHEMA)
+    conn.commit()
+
+
+def normalize(text):
+    """Casefold and strip accents: "Sacré-Cœur" -> "sacre-coeur"."""
+    text = unicodedata.normalize("NFKD", text.casefold()).translate(_FOLD)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def words(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def text_trigrams(text):
+    return set().union(*map(trigrams, words(text)))
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def fuzzy_query(match, category="", fields=SEARCH_COLUMNS):
+    """(sql, params) for the FTS candidates of a widened MATCH expression;
+    rows are name, city, then `fields`."""
+    category = (category or "").lower()
+    columns = ", ".join(f"p.{c}" for c in fields)
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = f"""
+        SELECT p.name, p.city, {columns}
+        FROM   places_fts
+        JOIN   places p ON p.rowid = places_fts.rowid
+        WHERE  places_fts MATCH ?
+        AND    (? = '' OR LOWER(p.category) = ?)
+        ORDER  BY bm25(places_fts, {weights})
+        LIMIT  ?
+    """
+    return sql, (match, category, category, CANDIDATES)
+
+
+class Vocabulary:
+    """Normalized name and city words with their trigram posting lists."""
+
+    def __init__(self, conn):
+        forms = {}
+        for term, docs in conn.execute("""
+            SELECT term, SUM(doc) FROM places_fts_terms
+            WHERE col IN ('name', 'city') GROUP BY term
+        """):
+            entry = forms.setdefault(normalize(term), ([], [0]))
+            entry[0].append(term)
+            entry[1][0] += docs
+
+        self.words = list(forms)
+        self.terms = [forms[w][0] for w in self.words]   # FTS terms per word
+        self.docs = np.array([forms[w][1][0] for w in self.words], dtype=np.int64)
+
+        postings, sizes = {}, []
+        for i, word in enumerate(self.words):
+            grams = trigrams(word)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+        self.sizes = np.array(sizes, dtype=np.int32)
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+
+    def closest(self, word, n=TERMS_PER_WORD):
+        """Indexes of up to n words most similar to `word`, best (then most
+        common) first."""
+        grams = trigrams(word)
+        hits = [self.postings[g] for g in grams if g in self.postings]
+        if not hits:
+            return []
+        shared = np.bincount(np.concatenate(hits), minlength=len(self.words))
+        ids = np.flatnonzero(shared)
+        shared = shared[ids]
+        score = shared / (len(grams) + self.sizes[ids] - shared)
+        keep = score >= MIN_SIMILARITY
+        ids, score = ids[keep], score[keep]
+        best = np.lexsort((-self.docs[ids], -score))[:n]
+        return ids[best].tolist()
+
+
+class FuzzyIndex:
+    """Fuzzy, accent-insensitive place search, used when the exact search
+    finds nothing. The vocabulary is rebuilt when the places generation
+    changes: in a background thread, with the previous one served until it
+    is ready (only the first build, normally during preload, is inline)."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.generation = None
+        self.vocab = None
+        self.rebuilding = False
+        self._lock = threading.Lock()
+
+    def vocabulary(self, conn):
+        generation = current_generation(conn)
+        with self._lock:
+            if self.vocab is None:
+                self.vocab = Vocabulary(conn)
+                self.generation = generation
+            elif generation != self.generation and not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self._rebuild, name="fuzzy-vocab", daemon=True).start()
+            return self.vocab
+
+    def _rebuild(self):
+        conn = connect(self.path)
+        try:
+            # Generation and words from one read, so the pair stays consistent
+            conn.execute("BEGIN")
+            generation = current_generation(conn)
+            vocab = Vocabulary(conn)
+            conn.rollback()
+            with self._lock:
+                self.vocab, self.generation = vocab, generation
+        except sqlite3.Error as e:
+            print("Fuzzy vocabulary rebuild failed:", e)
+        finally:
+            conn.close()
+            with self._lock:
+                self.rebuilding = False
+
+    def match_query(self, conn, term):
+        """FTS query for `term` with every word widened to its closest
+        vocabulary words, or "" when no word is close to anything."""
+        vocab = self.vocabulary(conn)
+        groups, matched = [], False
+        for word in words(term)[:MAX_WORDS]:
+            if len(word) < MIN_WORD_LENGTH:
+                groups.append(f'"{word}"*')
+                continue
+            # A word with no close match is dropped rather than failing the query
+            terms = [t for i in vocab.closest(word) for t in vocab.terms[i]]
+            if terms:
+                groups.append("(" + " OR ".join(f'"{t}"' for t in terms) + ")")
+                matched = True
+        if not matched:
+            return ""
+        return "{name city} : (" + " AND ".join(groups) + ")"
+
+    def search(self, conn, term, category="", limit=DEFAULT_LIMIT, fields=SEARCH_COLUMNS):
+        """Places whose name or city loosely matches `term`, closest first."""
+        match = self.match_query(conn, term)
+        if not match:
+            return []
+
+        # Abort the statement once it runs over budget
+        deadline = time.perf_counter() + FUZZY_BUDGET_MS / 1000
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+        try:
+            rows = conn.execute(*fuzzy_query(match, category, fields)).fetchall()
+        except sqlite3.OperationalError as e:
+            print("Fuzzy search failed:", e)
+            return []
+        finally:
+            conn.set_progress_handler(None, 0)
+
+        # Closest name (or name and city) to the whole query first, BM25 order
+        # among equals
+        wanted = text_trigrams(term)
+
+        def score(row):
+            name = text_trigrams(row[0] or "")
+            return max(jaccard(wanted, name), jaccard(wanted, name | text_trigrams(row[1] or "")))
+
+        rows.sort(key=score, reverse=True)
+        return [dict(zip(fields, row[2:])) for row in rows[:limit]]
+
+    def stats(self):
+        vocab = self.vocab
+        return {"generation": self.generation, "rebuilding": self.rebuilding,
+                "words": len(vocab.words) if vocab else 0,
+                "trigrams": len(vocab.postings) if vocab else 0}
+
+
+# Shared by every /search request
+fuzzy_index = FuzzyIndex()
@@ -0,0 +1,265 @@
+import csv
+import os
+import threading
+import time
+import unicodedata
+
+import requests
+
+from metrics import track_upstream
+
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+USER_AGENT = "Travelling-Search/1.0 (AI-Agent)"
+
+GEOCODE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS gazetteer (
+        name       TEXT NOT NULL,
+        name_key   TEXT NOT NULL,
+        country    TEXT,
+        lat        REAL NOT NULL,
+        lng        REAL NOT NULL,
+        population INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_gazetteer_name_key ON gazetteer (name_key, population DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS geocode_cache (
+        query   TEXT PRIMARY KEY,
+        lat     REAL,
+        lng     REAL,
+        found   INTEGER NOT NULL,
+        created REAL NOT NULL
+    )
+    """,
+]
+
+GAZETTEER_INSERT = (
+    "INSERT INTO gazetteer (name, name_key, country, lat, lng, population) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+# Seed gazetteer: the ingest areas plus the cities people ask the agent about
+# most. Load a GeoNames cities file with load_geonames() for full coverage.
+SEED_CITIES = [
+    ("Paris", "France", 48.8566, 2.3522, 2161000),
+    ("Rome", "Italy", 41.9028, 12.4964, 2873000),
+    ("New York", "USA", 40.7128, -74.0060, 8336000),
+    ("San Francisco", "USA", 37.7749, -122.4194, 815000),
+    ("London", "UK", 51.5074, -0.1278, 8982000),
+    ("Barcelona", "Spain", 41.3851, 2.1734, 1620000),
+    ("Sydney", "Australia", -33.8688, 151.2093, 5312000),
+    ("Toronto", "Canada", 43.651070, -79.347015, 2930000),
+    ("Cape Town", "South Africa", -33.9249, 18.4241, 4618000),
+    ("Bangkok", "Thailand", 13.7563, 100.5018, 10539000),
+    ("Dubai", "UAE", 25.276987, 55.296249, 3331000),
+    ("Berlin", "Germany", 52.5200, 13.4050, 3645000),
+    ("Tokyo", "Japan", 35.6762, 139.6503, 13960000),
+    ("Kyoto", "Japan", 35.0116, 135.7681, 1464000),
+    ("Seoul", "South Korea", 37.5665, 126.9780, 9776000),
+    ("Beijing", "China", 39.9042, 116.4074, 21540000),
+    ("Shanghai", "China", 31.2304, 121.4737, 24870000),
+    ("Hong Kong", "China", 22.3193, 114.1694, 7482000),
+    ("Singapore", "Singapore", 1.3521, 103.8198, 5686000),
+    ("Mumbai", "India", 19.0760, 72.8777, 12480000),
+    ("Delhi", "India", 28.7041, 77.1025, 16790000),
+    ("Istanbul", "Turkey", 41.0082, 28.9784, 15460000),
+    ("Cairo", "Egypt", 30.0444, 31.2357, 9540000),
+    ("Marrakesh", "Morocco", 31.6295, -7.9811, 928000),
+    ("Nairobi", "Kenya", -1.2921, 36.8219, 4397000),
+    ("Lagos", "Nigeria", 6.5244, 3.3792, 14860000),
+    ("Accra", "Ghana", 5.6037, -0.1870, 2291000),
+    ("Madrid", "Spain", 40.4168, -3.7038, 3223000),
+    ("Lisbon", "Portugal", 38.7223, -9.1393, 505000),
+    ("Amsterdam", "Netherlands", 52.3676, 4.9041, 872000),
+    ("Vienna", "Austria", 48.2082, 16.3738, 1897000),
+    ("Prague", "Czechia", 50.0755, 14.4378, 1309000),
+    ("Athens", "Greece", 37.9838, 23.7275, 664000),
+    ("Venice", "Italy", 45.4408, 12.3155, 261000),
+    ("Florence", "Italy", 43.7696, 11.2558, 382000),
+    ("Moscow", "Russia", 55.7558, 37.6173, 12500000),
+    ("Los Angeles", "USA", 34.0522, -118.2437, 3979000),
+    ("Chicago", "USA", 41.8781, -87.6298, 2694000),
+    ("Las Vegas", "USA", 36.1699, -115.1398, 651000),
+    ("Miami", "USA", 25.7617, -80.1918, 467000),
+    ("Mexico City", "Mexico", 19.4326, -99.1332, 9209000),
+    ("Rio de Janeiro", "Brazil", -22.9068, -43.1729, 6748000),
+    ("Buenos Aires", "Argentina", -34.6037, -58.3816, 3075000),
+    ("Lima", "Peru", -12.0464, -77.0428, 9752000),
+    ("Vancouver", "Canada", 49.2827, -123.1207, 675000),
+    ("Montreal", "Canada", 45.5017, -73.5673, 1780000),
+    ("Melbourne", "Australia", -37.8136, 144.9631, 5078000),
+    ("Auckland", "New Zealand", -36.8485, 174.7633, 1657000),
+    ("Reykjavik", "Iceland", 64.1466, -21.9426, 131000),
+]
+
+
+def normalize_place(text):
+    # Case- and accent-insensitive key: "Zürich " -> "zurich"
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
+
+
+def ensure_geocoder(conn):
+    for stmt in GEOCODE_SCHEMA:
+        conn.execute(stmt)
+    if conn.execute("SELECT 1 FROM gazetteer LIMIT 1").fetchone() is None:
+        conn.executemany(
+            GAZETTEER_INSERT,
+            [(name, normalize_place(name), country, lat, lng, pop)
+             for name, country, lat, lng, pop in SEED_CITIES],
+        )
+    conn.commit()
+
+
+def load_geonames(conn, path, batch_size=5000):
+    """Load a GeoNames cities file (e.g. cities15000.txt) into the gazetteer."""
+    batch = []
+    loaded = 0
+    with open(path, encoding="utf-8", newline="") as fh:
+        for row in csv.reader(fh, delimiter="\t", quoting=csv.QUOTE_NONE):
+            # 1 name, 4 latitude, 5 longitude, 8 country code, 14 population
+            batch.append((row[1], normalize_place(row[1]), row[8],
+                          float(row[4]), float(row[5]), int(row[14] or 0)))
+            if len(batch) >= batch_size:
+                conn.executemany(GAZETTEER_INSERT, batch)
+                loaded += len(batch)
+                batch = []
+    if batch:
+        conn.executemany(GAZETTEER_INSERT, batch)
+        loaded += len(batch)
+    conn.commit()
+    return loaded
+
+
+class RateLimited(Exception):
+    pass
+
+
+class RateLimiter:
+    """Allow at most one call per `interval` seconds across all threads."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self, max_wait=None):
+        """Sleep until the caller's turn; raises RateLimited, without taking
+        a turn, if that is more than max_wait seconds away."""
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            if max_wait is not None and delay > max_wait:
+                raise RateLimited("too many geocoding requests queued, try again shortly")
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Geocoder:
+    """Resolve place names to coordinates, cheapest source first:
+    places table, gazetteer, geocode_cache, then Nominatim."""
+
+    def __init__(self, ttl=30 * 24 * 3600, negative_ttl=24 * 3600, timeout=5.0,
+                 min_interval=1.0, max_wait=5.0):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_wait = max_wait
+        self.limiter = RateLimiter(min_interval)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        self.counts = {"places": 0, "gazetteer": 0, "cache": 0, "remote": 0, "not_found": 0,
+                       "rate_limited": 0}
+
+    def lookup_local(self, conn, query):
+        row = conn.execute(
+            "SELECT lat, lng FROM places WHERE name = ? COLLATE NOCASE AND lat IS NOT NULL LIMIT 1",
+            (query,),
+        ).fetchone()
+        if row:
+            self.counts["places"] += 1
+            return row[0], row[1]
+
+        # "Paris" or "Paris, France": match the city part, largest first
+        key = normalize_place(query)
+        city, _, country = key.partition(",")
+        rows = conn.execute("""
+            SELECT lat, lng, country FROM gazetteer
+            WHERE  name_key = ?
+            ORDER  BY population DESC
+        """, (city.strip(),)).fetchall()
+        if rows:
+            country = country.strip()
+            match = next((r for r in rows if country and normalize_place(r[2] or "") == country), rows[0])
+            self.counts["gazetteer"] += 1
+            return match[0], match[1]
+        return None
+
+    def lookup_cache(self, conn, key):
+        row = conn.execute(
+            "SELECT lat, lng, found, created FROM geocode_cache WHERE query = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        lat, lng, found, created = row
+        ttl = self.ttl if found else self.negative_ttl
+        if created + ttl < time.time():
+            return None
+        self.counts["cache"] += 1
+        return (lat, lng) if found else (None, None)
+
+    def lookup_remote(self, query):
+        try:
+            self.limiter.wait(self.max_wait)
+        except RateLimited:
+            self.counts["rate_limited"] += 1
+            raise
+        with track_upstream("nominatim"):
+            res = self.session.get(NOMINATIM_URL, params={"q": query, "format": "json", "limit": 1},
+                                   timeout=self.timeout)
+            res.raise_for_status()
+            data = res.json()
+        self.counts["remote"] += 1
+        if not data:
+            return None, None
+        return float(data[0]["lat"]), float(data[0]["lon"])
+
+    def geocode(self, pool, query):
+        """Return (lat, lng), or (None, None) when the place is unknown.
+
+        A connection is borrowed from `pool` only for the local lookups and
+        the cache write, never across the rate limiter or the remote call.
+        Raises RateLimited when too many remote lookups are already queued.
+        """
+        query = query.strip()
+        if not query:
+            return None, None
+
+        key = normalize_place(query)
+        with pool.connection() as conn:
+            local = self.lookup_local(conn, query)
+            if local:
+                return local
+            cached = self.lookup_cache(conn, key)
+            if cached is not None:
+                return cached
+
+        try:
+            lat, lng = self.lookup_remote(query)
+        except (requests.RequestException, ValueError, KeyError) as e:
+            # Transient failures are not cached
+            print("Geocoding failed:", e)
+            return None, None
+
+        if lat is None:
+            self.counts["not_found"] += 1
+        with pool.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache (query, lat, lng, found, created) VALUES (?, ?, ?, ?, ?)",
+                (key, lat, lng, int(lat is not None), time.time()),
+            )
+            conn.commit()
+        return lat, lng
@@ -0,0 +1,113 @@
+"""gunicorn settings for production: gunicorn -c gunicorn.conf.py
+
+The app is loaded once in the master (wsgi.py preloads the shared read-only
+state) and forked into WEB_CONCURRENCY threaded workers, one per core by
+default. The weather WebSocket hub (server.py) runs as a child process of
+the master, which restarts it whenever it exits.
+
+    kill -HUP  <master>   restart workers gracefully (the hub keeps running)
+    kill -TERM <master>   graceful shutdown of workers and the hub
+    kill -USR2 <master>   start a new master on new code, then -TERM the old one;
+                          the new master's hub binds once the old one has
+                          stopped (up to WS_RESTART_DELAY seconds later)
+"""
+import gc
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+wsgi_app = "wsgi:app"
+preload_app = True
+
+timeout = 120           # streamed model answers can take a while
+graceful_timeout = 30
+keepalive = 5
+max_requests = 10000    # recycle workers to bound slow leaks
+max_requests_jitter = 1000
+accesslog = "-"
+
+# Prometheus samples from every worker are aggregated through this directory
+# (must be set before prometheus_client is imported by the preloaded app).
+# This file is re-read on HUP, by which time the variable is already set.
+if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = os.path.join(tempfile.gettempdir(),
+                                                          "travelling-prometheus")
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+WS_ENABLED = os.getenv("WS_ENABLED", "1") == "1"
+WS_RESTART_DELAY = float(os.getenv("WS_RESTART_DELAY", 5))
+# Load the Gemini SDK in each worker right after fork rather than on its
+# first /ask, at the cost of the memory for workers that never use it
+AI_WARMUP = os.getenv("AI_WARMUP") == "1"
+
+
+def supervise_hub(server):
+    # Keep one hub running for the life of this master. It exits when it
+    # crashes and also when it can't bind because another master's hub still
+    # holds the port (during a USR2 upgrade); either way, start it again.
+    hub_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+    while True:
+        with server.ws_lock:
+            if server.ws_stopping.is_set():
+                return
+            # A fresh interpreter rather than a fork: the hub runs its own
+            # event loop, and workers forked later must not think they own it
+            server.ws_process = subprocess.Popen([sys.executable, hub_script])
+        server.log.info("Started weather hub (pid %s)", server.ws_process.pid)
+        code = server.ws_process.wait()
+        if server.ws_stopping.wait(WS_RESTART_DELAY):
+            return
+        server.log.warning("Weather hub exited (%s); restarting", code)
+
+
+def when_ready(server):
+    if not WS_ENABLED:
+        return
+    # State lives on the arbiter since this module's globals are reset by a
+    # HUP reload (when_ready itself only runs once per master)
+    server.ws_lock = threading.Lock()
+    server.ws_stopping = threading.Event()
+    server.ws_process = None
+    threading.Thread(target=supervise_hub, args=(server,), name="ws-hub", daemon=True).start()
+
+
+def pre_fork(server, worker):
+    # Move the preloaded objects out of the GC's reach so collections in the
+    # workers don't touch (and un-share) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if AI_WARMUP:
+        # Per worker, not preloaded: the SDK's gRPC threads don't survive fork
+        import ai_routes
+        ai_routes.warmup(background=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if not hasattr(server, "ws_stopping"):
+        return
+    with server.ws_lock:
+        server.ws_stopping.set()
+        hub = server.ws_process
+    if hub is not None and hub.poll() is None:
+        hub.terminate()   # SIGTERM: the hub closes its sockets and exits
+        try:
+            hub.wait(graceful_timeout)
+        except subprocess.TimeoutExpired:
+            hub.kill()
+        server.log.info("Stopped weather hub")
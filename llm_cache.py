@@ -0,0 +1,121 @@
+import hashlib
+import threading
+import time
+
+from cache import TTLCache
+
+# The prompt_cache table predates this module as (prompt PRIMARY KEY,
+# response). The prompt column now holds the cache key (a hash of the
+# normalized prompt, model name and system instruction) and two columns are
+# added for expiry and eviction.
+PROMPT_CACHE_COLUMNS = {
+    "created": "REAL NOT NULL DEFAULT 0",
+    "last_hit": "REAL NOT NULL DEFAULT 0",
+}
+
+
+def ensure_prompt_cache(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS prompt_cache (prompt TEXT PRIMARY KEY, response TEXT)")
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(prompt_cache)")}
+    for name, decl in PROMPT_CACHE_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE prompt_cache ADD COLUMN {name} {decl}")
+    conn.commit()
+
+
+def normalize_prompt(prompt):
+    return " ".join(prompt.lower().split())
+
+
+def make_key(prompt, model_name, system_instruction=""):
+    system_hash = hashlib.sha256(system_instruction.encode()).hexdigest()
+    raw = "\x1f".join((model_name, system_hash, normalize_prompt(prompt)))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class PromptCache:
+    """Two-tier response cache: an in-memory LRU over the prompt_cache table."""
+
+    def __init__(self, ttl=7 * 24 * 3600, memory_size=512, max_rows=50000, trim_every=100):
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.trim_every = trim_every
+        self.memory = TTLCache(memory_size, ttl)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, conn, key):
+        response = self.memory.get(key)
+        if response is not None:
+            self._count("memory_hits")
+            return response
+
+        now = time.time()
+        row = conn.execute(
+            "SELECT response, created FROM prompt_cache WHERE prompt = ?", (key,)
+        ).fetchone()
+        if row is None or row[1] + self.ttl < now:
+            self._count("misses")
+            return None
+
+        conn.execute("UPDATE prompt_cache SET last_hit = ? WHERE prompt = ?", (now, key))
+        conn.commit()
+        self.memory.set(key, row[0], ttl=row[1] + self.ttl - now)
+        self._count("disk_hits")
+        return row[0]
+
+    def set(self, conn, key, response):
+        now = time.time()
+        self.memory.set(key, response)
+        conn.execute("""
+            INSERT OR REPLACE INTO prompt_cache (prompt, response, created, last_hit)
+            VALUES (?, ?, ?, ?)
+        """, (key, response, now, now))
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % self.trim_every == 0
+        if trim:
+            self.trim(conn)
+        conn.commit()
+
+    def trim(self, conn):
+        # Drop expired rows, then the least recently used beyond max_rows
+        conn.execute("DELETE FROM prompt_cache WHERE created < ?", (time.time() - self.ttl,))
+        conn.execute("""
+            DELETE FROM prompt_cache WHERE prompt IN (
+                SELECT prompt FROM prompt_cache
+                ORDER BY MAX(created, last_hit) DESC
+                LIMIT -1 OFFSET ?
+            )
+        """, (self.max_rows,))
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "memory_size": len(self.memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+def replay_chunks(text, size=80):
+    """Split a cached response into stream-sized chunks on word boundaries."""
+    chunk = ""
+    for word in text.split(" "):
+        if chunk and len(chunk) + len(word) + 1 > size:
+            yield chunk + " "
+            chunk = word
+        else:
+            chunk = f"{chunk} {word}" if chunk else word
+    if chunk:
+        yield chunk
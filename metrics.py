@@ -0,0 +1,200 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter,
+                               Histogram, generate_latest, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+# Prometheus instrumentation: request latency per route, SQLite statement
+# timing with a slow-query log, outbound call timing and errors, and the
+# stats() of the in-process caches, served at /metrics. PROFILING_ENABLED=1
+# additionally lets ?profile=1 return a cProfile summary instead of the page.
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 100))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED") == "1"
+PROFILE_LINES = 40
+
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Flask request latency",
+                            ["method", "route", "status"])
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "SQLite statement latency",
+                             ["statement"], buckets=DB_BUCKETS)
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "SQLite statements slower than SLOW_QUERY_MS")
+UPSTREAM_SECONDS = Histogram("upstream_request_duration_seconds", "Outbound call latency",
+                             ["service"])
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Outbound calls that failed", ["service"])
+
+_STATEMENT_RE = re.compile(r"\s*(\w+)")
+
+
+def observe_query(sql, elapsed):
+    match = _STATEMENT_RE.match(sql)
+    DB_QUERY_SECONDS.labels(match.group(1).upper() if match else "OTHER").observe(elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        DB_SLOW_QUERIES.inc()
+        print(f"🐢 Slow query ({elapsed * 1000:.0f} ms): {' '.join(sql.split())[:300]}")
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Times each statement from execute() until its rows run out, or until
+    the cursor is closed, reused or dropped: execute() alone only covers the
+    step to the first row. Iteration isn't hooked (a Python __next__ would
+    double the cost of reading rows); `for row in conn.execute(..)` records
+    when the loop lets go of the cursor."""
+
+    _pending = None   # (sql, start) of a SELECT whose rows are still being read
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            observe_query(pending[0], time.perf_counter() - pending[1])
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        self._pending = (sql, time.perf_counter())
+        try:
+            super().execute(sql, parameters)
+        except BaseException:
+            self._finish()
+            raise
+        if self.description is None:   # no result rows to wait for
+            self._finish()
+        return self
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._finish()
+        return rows
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observe_query(sql, time.perf_counter() - start)
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements are all timed."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    # The C shortcuts don't go through cursor(), so route them explicitly
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+@contextmanager
+def track_upstream(service):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(service).inc()
+        raise
+    finally:
+        UPSTREAM_SECONDS.labels(service).observe(time.perf_counter() - start)
+
+
+class StatsCollector:
+    """Publishes the numeric stats() of caches, pools and executors as gauges,
+    read at scrape time (e.g. search_cache_hit_ratio)."""
+
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, name, stats):
+        self.sources[name] = stats
+
+    def collect(self):
+        for name, stats in list(self.sources.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"⚠️ Could not collect {name} stats: {e}")
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                gauge = GaugeMetricFamily(f"{name}_{key}", f"{name} {key}")
+                gauge.add_metric([], value)
+                yield gauge
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+metrics_bp = Blueprint("metrics_bp", __name__)
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if PROFILING_ENABLED and request.args.get("profile") == "1":
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+@metrics_bp.after_app_request
+def record_request(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+        response = Response(out.getvalue(), mimetype="text/plain",
+                            headers={"X-Profiled-Status": str(response.status_code)})
+
+    start = g.pop("request_start", None)
+    if start is not None:
+        # The rule, not the path, so /api/trip_days/<id> is one series
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(
+            time.perf_counter() - start)
+    return response
+
+
+@metrics_bp.route("/metrics")
+def metrics():
+    registry = REGISTRY
+    # Under gunicorn (see gunicorn.conf.py) every worker writes its samples
+    # to PROMETHEUS_MULTIPROC_DIR and any worker can aggregate them; the
+    # stats gauges are this worker's own
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
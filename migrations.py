@@ -0,0 +1,229 @@
+import sqlite3
+
+from cache import GENERATION_SCHEMA, ensure_generation_counter
+from fuzzy import ensure_fuzzy_vocab
+from geocode import ensure_geocoder
+from llm_cache import ensure_prompt_cache
+from search_index import FTS_SCHEMA, ensure_search_index
+from spatial import RTREE_SCHEMA, ensure_spatial_index
+
+# Versioned schema migrations, tracked in PRAGMA user_version. Each step runs
+# once per database, in order; steps are written to be safe on databases that
+# already have some of their objects (the committed database.db predates
+# this module).
+
+BASE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS favorites (
+        username TEXT,
+        place_id INTEGER,
+        PRIMARY KEY (username, place_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trips (
+        id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        username  TEXT    NOT NULL,
+        title     TEXT    NOT NULL,
+        start     DATE    NOT NULL,
+        "end"     DATE    NOT NULL,
+        created   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS trip_days (
+        id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        trip_id   INTEGER NOT NULL,
+        trip_date DATE    NOT NULL,
+        place_id  TEXT    NOT NULL,
+        pos       INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY (trip_id) REFERENCES trips(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS places (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        city TEXT,
+        lat REAL,
+        lng REAL,
+        description TEXT,
+        image_url TEXT,
+        category TEXT,
+        rating REAL
+    )
+    """,
+]
+
+SECONDARY_INDEXES = [
+    # /api/trip_days, update_trip and the trip_days FK cascade
+    "CREATE INDEX IF NOT EXISTS idx_trip_days_trip ON trip_days (trip_id, trip_date, pos)",
+    # /trips lists a user's trips newest first
+    "CREATE INDEX IF NOT EXISTS idx_trips_username_start ON trips (username, start)",
+    # Case-insensitive lookups by city/name and the search category filter
+    "CREATE INDEX IF NOT EXISTS idx_places_city_nocase ON places (city COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_places_name_nocase ON places (name COLLATE NOCASE)",
+    "CREATE INDEX IF NOT EXISTS idx_places_category_lower ON places (LOWER(category))",
+]
+
+# SQLite can't add ON DELETE CASCADE to an existing foreign key, so
+# trip_days is rebuilt (see https://www.sqlite.org/lang_altertable.html)
+TRIP_DAYS_CASCADE = [
+    """
+    CREATE TABLE trip_days_new (
+        id        INTEGER PRIMARY KEY AUTOINCREMENT,
+        trip_id   INTEGER NOT NULL REFERENCES trips(id) ON DELETE CASCADE,
+        trip_date DATE    NOT NULL,          -- ISO yyyy-mm-dd
+        place_id  TEXT    NOT NULL,          -- FK -> places.id
+        pos       INTEGER NOT NULL DEFAULT 0 -- ordering for that day
+    )
+    """,
+    """
+    INSERT INTO trip_days_new (id, trip_id, trip_date, place_id, pos)
+    SELECT td.id, td.trip_id, td.trip_date, td.place_id, td.pos
+    FROM   trip_days td
+    WHERE  EXISTS (SELECT 1 FROM trips t WHERE t.id = td.trip_id)
+    """,
+    "DROP TABLE trip_days",
+    "ALTER TABLE trip_days_new RENAME TO trip_days",
+    "CREATE INDEX IF NOT EXISTS idx_trip_days_trip ON trip_days (trip_id, trip_date, pos)",
+]
+
+# places.id is a TEXT primary key, so the table's rowid was implicit and
+# VACUUM may renumber it, desyncing places_fts, places_rtree and the feed
+# cursors, which are all keyed on it. The table is rebuilt with an explicit
+# INTEGER PRIMARY KEY (a rowid alias, which VACUUM preserves) holding the
+# current rowids, so nothing keyed on them moves. Dropping places drops its
+# triggers and indexes; they are recreated afterwards.
+PLACES_ROWID_ALIAS = [
+    """
+    CREATE TABLE places_new (
+        seq INTEGER PRIMARY KEY,   -- the rowid, stable across VACUUM
+        id TEXT UNIQUE,
+        name TEXT,
+        city TEXT,
+        lat REAL,
+        lng REAL,
+        description TEXT,
+        image_url TEXT,
+        category TEXT,
+        rating REAL
+    )
+    """,
+    """
+    INSERT INTO places_new (seq, id, name, city, lat, lng, description, image_url, category, rating)
+    SELECT rowid, id, name, city, lat, lng, description, image_url, category, rating
+    FROM   places
+    """,
+    "DROP TABLE places",
+    "ALTER TABLE places_new RENAME TO places",
+    *FTS_SCHEMA,
+    *RTREE_SCHEMA,
+    *GENERATION_SCHEMA,
+    *(stmt for stmt in SECONDARY_INDEXES if " ON places " in stmt),
+]
+
+
+def _run(statements):
+    def step(conn):
+        for stmt in statements:
+            conn.execute(stmt)
+    return step
+
+
+def _cascade_trip_days(conn):
+    # Foreign key enforcement must be off while the table is swapped out;
+    # the pragma is a no-op inside a transaction, so commit first
+    conn.commit()
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        conn.execute("BEGIN")
+        _run(TRIP_DAYS_CASCADE)(conn)
+        problems = conn.execute("PRAGMA foreign_key_check(trip_days)").fetchall()
+        if problems:
+            raise sqlite3.IntegrityError(f"trip_days foreign key check failed: {problems[:5]}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
+
+
+def _alias_places_rowid(conn):
+    # One transaction, so places is never seen without its triggers
+    conn.commit()
+    try:
+        conn.execute("BEGIN")
+        _run(PLACES_ROWID_ALIAS)(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+MIGRATIONS = [
+    (1, "base schema", _run(BASE_SCHEMA)),
+    (2, "full-text search index", ensure_search_index),
+    (3, "spatial index", ensure_spatial_index),
+    (4, "places data generation counter", ensure_generation_counter),
+    (5, "prompt cache expiry columns", ensure_prompt_cache),
+    (6, "geocoder gazetteer and cache", ensure_geocoder),
+    (7, "secondary indexes", _run(SECONDARY_INDEXES)),
+    (8, "trip_days ON DELETE CASCADE", _cascade_trip_days),
+    (9, "fuzzy search vocabulary", ensure_fuzzy_vocab),
+    (10, "places INTEGER PRIMARY KEY rowid alias", _alias_places_rowid),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def refresh_stats(conn):
+    """Re-gather planner statistics. Sampled, so cheap enough to run after
+    every ingest; stats from when a table was small mislead the planner."""
+    conn.execute("PRAGMA analysis_limit = 1000")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+
+def stats_stale(conn, table="places", factor=2):
+    """True when the table's row count has drifted `factor`x from its stats."""
+    try:
+        row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table,)).fetchone()
+    except sqlite3.OperationalError:   # never analyzed
+        row = None
+    counted = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    recorded = int(row[0].split()[0]) if row else 0
+    return max(counted, recorded) > factor * max(1, min(counted, recorded))
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target=SCHEMA_VERSION):
+    """Apply every pending migration up to `target`; returns the new version."""
+    current = schema_version(conn)
+    applied = False
+    for version, description, step in MIGRATIONS:
+        if current < version <= target:
+            print(f"Applying migration {version}: {description}")
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            current = version
+            applied = True
+    # Refresh planner statistics so the new indexes are picked up, and when
+    # places grew or shrank since they were taken (e.g. stats from an empty
+    # database make the planner scan places instead of the R*Tree)
+    if applied or (current and stats_stale(conn)):
+        refresh_stats(conn)
+    return current
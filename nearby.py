@@ -0,0 +1,127 @@
+import math
+import sqlite3
+import threading
+
+import numpy as np
+
+from cache import current_generation
+from db import DB_PATH, connect
+from routing import unit_vectors
+from spatial import EARTH_RADIUS_M, PLACE_COLUMNS
+
+DEFAULT_K = 10
+MAX_K = 100
+AGENT_K = 8                  # attractions shown around an agent "fly to"
+AGENT_RADIUS_M = 20000
+
+
+def chord_for(radius_m):
+    # Straight-line distance between unit vectors for a great-circle radius
+    return 2 * math.sin(min(radius_m / EARTH_RADIUS_M, math.pi) / 2)
+
+
+class NearbyIndex:
+    """k-nearest-neighbour search over every located place.
+
+    Places are points on the unit sphere in a KD-tree, so Euclidean (chord)
+    order is great-circle order and there is no trouble at the poles or the
+    antimeridian. Per-category trees are built on first use. When the places
+    generation changes, the rows and the trees in use are rebuilt in a
+    background thread and the previous ones are served until the swap (only
+    the first load, normally during preload, is inline).
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.generation = None
+        self.rows = []
+        self.points = None
+        self.categories = []
+        self.trees = {}   # category (None for all) -> (tree, row indexes)
+        self.rebuilding = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(conn):
+        columns = ", ".join(PLACE_COLUMNS)
+        rows = conn.execute(f"""
+            SELECT {columns} FROM places
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+        """).fetchall()
+        rows = [dict(zip(PLACE_COLUMNS, row)) for row in rows]
+        points = unit_vectors([r["lat"] for r in rows], [r["lng"] for r in rows])
+        return rows, points, [(r["category"] or "").lower() for r in rows]
+
+    @staticmethod
+    def _build_tree(points, categories, category):
+        from scipy.spatial import cKDTree  # ~0.3 s to import, so not at startup
+
+        if category is None:
+            members = np.arange(len(categories))
+        else:
+            members = np.array([i for i, c in enumerate(categories) if c == category],
+                               dtype=np.int64)
+        return cKDTree(points[members]) if len(members) else None, members
+
+    def _tree(self, category):
+        entry = self.trees.get(category)
+        if entry is None:
+            entry = self.trees[category] = self._build_tree(self.points, self.categories, category)
+        return entry
+
+    def _rebuild(self):
+        conn = connect(self.path)
+        try:
+            # Generation and rows from one read, so the pair stays consistent
+            conn.execute("BEGIN")
+            generation = current_generation(conn)
+            rows, points, categories = self._load(conn)
+            conn.rollback()
+            trees = {category: self._build_tree(points, categories, category)
+                     for category in list(self.trees)}
+            with self._lock:
+                self.rows, self.points, self.categories = rows, points, categories
+                self.trees, self.generation = trees, generation
+        except sqlite3.Error as e:
+            print("Nearby index rebuild failed:", e)
+        finally:
+            conn.close()
+            with self._lock:
+                self.rebuilding = False
+
+    def query(self, conn, lat, lng, k=DEFAULT_K, radius_m=None, category=None):
+        """Up to k places nearest to (lat, lng), closest first, with distance_m."""
+        generation = current_generation(conn)
+        with self._lock:
+            if self.points is None:
+                self.rows, self.points, self.categories = self._load(conn)
+                self.generation = generation
+            elif generation != self.generation and not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self._rebuild, name="nearby-index", daemon=True).start()
+            tree, members = self._tree(category.lower() if category else None)
+            rows = self.rows
+
+        if tree is None:
+            return []
+        k = min(k, len(members))
+        bound = chord_for(radius_m) if radius_m else np.inf
+        chords, hits = tree.query(unit_vectors([lat], [lng])[0], k=k, distance_upper_bound=bound)
+        chords, hits = np.atleast_1d(chords), np.atleast_1d(hits)
+
+        results = []
+        for chord, hit in zip(chords, hits):
+            if hit >= len(members):   # fewer than k within the radius
+                break
+            place = dict(rows[members[hit]])
+            place["distance_m"] = round(2 * EARTH_RADIUS_M * math.asin(min(chord / 2, 1.0)), 1)
+            results.append(place)
+        return results
+
+    def stats(self):
+        return {"generation": self.generation, "places": len(self.rows), "trees": len(self.trees),
+                "rebuilding": self.rebuilding}
+
+
+# Shared by the /api/nearby route and the agent's fly-to answers
+nearby_index = NearbyIndex()
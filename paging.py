@@ -0,0 +1,70 @@
+import base64
+import binascii
+import json
+
+from flask import Response, request, url_for
+
+# Cursor pagination and NDJSON streaming shared by the list endpoints. List
+# bodies keep their shape; the next page is advertised in the X-Next-Cursor
+# and Link headers. Cursors are opaque to clients (base64 JSON).
+
+STREAM_BATCH = 500
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(state):
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(value):
+    if not value:
+        return {}
+    try:
+        state = json.loads(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)))
+    except (ValueError, binascii.Error):
+        raise ValueError("invalid cursor")
+    if not isinstance(state, dict):
+        raise ValueError("invalid cursor")
+    return state
+
+
+def wants_ndjson():
+    return (request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == NDJSON)
+
+
+def with_next_cursor(resp, state):
+    """Advertise the next page on a response, if there is one."""
+    if state is not None:
+        cursor = encode_cursor(state)
+        args = {k: v for k, v in request.args.items() if k not in ("cursor", "offset")}
+        resp.headers["X-Next-Cursor"] = cursor
+        resp.headers["Link"] = f'<{url_for(request.endpoint, **args, cursor=cursor)}>; rel="next"'
+    return resp
+
+
+def iter_rows(conn, sql, params, transform):
+    # fetchmany keeps only one batch of rows in memory at a time
+    cur = conn.execute(sql, params)
+    while True:
+        rows = cur.fetchmany(STREAM_BATCH)
+        if not rows:
+            break
+        for row in rows:
+            yield transform(row)
+
+
+def stream_ndjson(pool, sql, params, transform):
+    """Stream a query as NDJSON, one object per row.
+
+    The connection is borrowed from the pool inside the generator, so it is
+    held for exactly as long as the body is being sent (the request's own
+    connection is returned before streaming starts).
+    """
+    def generate():
+        with pool.connection() as conn:
+            for item in iter_rows(conn, sql, params, transform):
+                yield json.dumps(item, separators=(",", ":")) + "\n"
+
+    return Response(generate(), mimetype=NDJSON)
@@ -0,0 +1,315 @@
+import time
+
+import numpy as np
+
+from distances import distance_matrix, distance_store, travel_seconds
+
+# Visiting-order optimizer for one day of a trip. Routes are open paths (the
+# day doesn't return to its first stop). Small days are solved exactly with
+# Held-Karp; larger ones start from nearest-neighbour and are improved with
+# 2-opt and Or-opt until no move helps or the time budget runs out.
+
+HELD_KARP_MAX = 12          # exact DP up to this many stops (2^n * n states)
+DEFAULT_TIME_BUDGET = 0.5   # seconds of local search per day
+MAX_TIME_BUDGET = 5.0
+MAX_STOPS = 500
+EPSILON = 1e-6              # metres; smaller gains are rounding noise
+
+
+def path_length(dist, order):
+    order = np.asarray(order, dtype=np.int64)
+    if len(order) < 2:
+        return 0.0
+    return float(dist[order[:-1], order[1:]].sum())
+
+
+def clamp_budget(value):
+    try:
+        budget = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_TIME_BUDGET
+    return min(max(budget, 0.0), MAX_TIME_BUDGET)
+
+
+def held_karp(dist, fixed_start=False):
+    """Exact shortest open path; starts at stop 0 when fixed_start."""
+    n = len(dist)
+    full = 1 << n
+    bits = 1 << np.arange(n)
+    cost = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int64)
+    for start in ([0] if fixed_start else range(n)):
+        cost[1 << start, start] = 0.0
+
+    for mask in range(1, full):
+        members = np.flatnonzero(mask & bits)
+        if len(members) < 2:
+            continue
+        # Row j: best path over mask - {j} ending at k, then k -> j
+        candidates = cost[mask ^ bits[members]][:, members] + dist[np.ix_(members, members)].T
+        best = candidates.argmin(axis=1)
+        cost[mask, members] = candidates[np.arange(len(members)), best]
+        parent[mask, members] = members[best]
+
+    mask, last = full - 1, int(cost[full - 1].argmin())
+    order = []
+    while last >= 0:
+        order.append(last)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    return order[::-1]
+
+
+def nearest_neighbour(dist, start):
+    n = len(dist)
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[order[-1]])
+        nxt = int(row.argmin())
+        order.append(nxt)
+        visited[nxt] = True
+    return order
+
+
+def _two_opt(tour, dist, lo, deadline):
+    """One pass of segment reversals over a closed tour; True if improved."""
+    m = len(tour)
+    improved = False
+    for i in range(lo, m - 1):
+        if time.monotonic() > deadline:
+            break
+        a, b = tour[i - 1], tour[i]
+        ends = tour[i + 1:]
+        after = np.append(tour[i + 2:], tour[0])
+        delta = dist[a, ends] + dist[b, after] - dist[a, b] - dist[ends, after]
+        j = int(delta.argmin())
+        if delta[j] < -EPSILON:
+            j += i + 1
+            tour[i:j + 1] = tour[i:j + 1][::-1].copy()
+            improved = True
+    return improved
+
+
+def _or_opt(tour, dist, lo, deadline):
+    """Move runs of 1-3 stops (either way round) to a cheaper position."""
+    m = len(tour)
+    improved = False
+    for seg_len in (1, 2, 3):
+        i = lo
+        while i + seg_len <= m:
+            if time.monotonic() > deadline:
+                return improved
+            first, last = tour[i], tour[i + seg_len - 1]
+            prev, nxt = tour[i - 1], tour[(i + seg_len) % m]
+            removed = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+
+            rest = np.concatenate((tour[:i], tour[i + seg_len:]))
+            # Insert between rest[k] and rest[k + 1]; k >= lo - 1 keeps the
+            # anchored prefix in place
+            xs = rest[lo - 1:]
+            ys = np.append(rest[lo:], rest[0])
+            forward = dist[xs, first] + dist[last, ys]
+            backward = dist[xs, last] + dist[first, ys]
+            added = np.minimum(forward, backward) - dist[xs, ys]
+            added[i - lo] = np.inf  # its current slot
+            k = int(added.argmin())
+            if added[k] - removed < -EPSILON:
+                segment = tour[i:i + seg_len].copy()
+                if backward[k] < forward[k]:
+                    segment = segment[::-1]
+                at = k + lo
+                tour[:] = np.concatenate((rest[:at], segment, rest[at:]))
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def solve(dist, fixed_start=False, time_budget=DEFAULT_TIME_BUDGET):
+    """Near-optimal open visiting order; returns (order, metres, method)."""
+    n = len(dist)
+    if n <= 2:
+        return list(range(n)), path_length(dist, range(n)), "trivial"
+    if n <= HELD_KARP_MAX:
+        order = held_karp(dist, fixed_start)
+        return order, path_length(dist, order), "exact"
+
+    deadline = time.monotonic() + time_budget
+    # Start from the stop farthest from everything else so the greedy path
+    # doesn't strand an outlier at the end
+    start = 0 if fixed_start else int(dist.sum(axis=1).argmax())
+    order = nearest_neighbour(dist, start)
+
+    # A zero-cost dummy node closes the path into a tour so the usual
+    # tour moves apply; it sits at index 0 (and the fixed start at 1)
+    padded = np.zeros((n + 1, n + 1))
+    padded[1:, 1:] = dist
+    tour = np.array([0] + [o + 1 for o in order], dtype=np.int64)
+    lo = 2 if fixed_start else 1
+    while time.monotonic() < deadline:
+        reversed_ = _two_opt(tour, padded, lo, deadline)
+        moved = _or_opt(tour, padded, lo, deadline)
+        if not (reversed_ or moved):
+            break
+
+    order = [int(o) - 1 for o in tour[1:]]
+    length = path_length(dist, order)
+    identity = path_length(dist, range(n))
+    if identity <= length:
+        return list(range(n)), identity, "heuristic"
+    return order, length, "heuristic"
+
+
+def order_places(conn, place_ids, fixed_start=False, time_budget=DEFAULT_TIME_BUDGET):
+    """Reorder place ids for the shortest walk between them.
+
+    Places without coordinates keep their relative order at the end of the
+    day. The first place stays first when fixed_start (e.g. the hotel).
+    """
+    place_ids = [str(pid) for pid in place_ids]
+    coords = distance_store.coords(conn, place_ids)
+    located = [pid for pid in place_ids if pid in coords]
+    unlocated = [pid for pid in place_ids if pid not in coords]
+    if fixed_start and place_ids and place_ids[0] not in coords:
+        fixed_start = False
+
+    dist = distance_matrix([coords[p][0] for p in located], [coords[p][1] for p in located])
+    started = time.monotonic()
+    order, length, method = solve(dist, fixed_start, time_budget)
+    return {
+        "places": [located[i] for i in order] + unlocated,
+        "distance_m": round(length, 1),
+        "walking_s": round(float(travel_seconds(length))),
+        "original_distance_m": round(path_length(dist, range(len(located))), 1),
+        "method": method,
+        "unlocated": unlocated,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+# Multi-day planning: places are split into one balanced geographic cluster
+# per day, days are ordered so consecutive clusters are near each other, and
+# each day is then ordered with solve().
+
+MAX_TRIP_DAYS = 60
+MAX_PLAN_PLACES = 2000
+KMEANS_ITERATIONS = 25
+
+
+def unit_vectors(lats, lngs):
+    lat = np.radians(np.asarray(lats, dtype=float))
+    lng = np.radians(np.asarray(lngs, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+
+
+def capacitated_assign(sq_dist, capacity):
+    """Label each point with a cluster, nearest first, none over capacity.
+
+    Works in rounds: every unassigned point bids for its nearest cluster with
+    room left, and each cluster takes its closest bidders up to that room. A
+    round either places every bidder or fills a cluster, so there are at most
+    k rounds.
+    """
+    n, k = sq_dist.shape
+    labels = np.full(n, -1, dtype=np.int64)
+    room = np.full(k, capacity, dtype=np.int64)
+    cost = np.array(sq_dist, dtype=float)
+    todo = np.arange(n)
+    while len(todo):
+        choice = cost[todo].argmin(axis=1)
+        bid = cost[todo, choice]
+        # Bidders grouped by cluster, closest first, then ranked within it
+        order = np.lexsort((bid, choice))
+        choice = choice[order]
+        rank = np.arange(len(order)) - np.searchsorted(choice, choice)
+        won = rank < room[choice]
+        labels[todo[order[won]]] = choice[won]
+        room -= np.bincount(choice[won], minlength=k)
+        cost[:, room == 0] = np.inf
+        todo = todo[order[~won]]
+    return labels
+
+
+def balanced_kmeans(points, k, capacity, iterations=KMEANS_ITERATIONS, seed=0, deadline=None):
+    """k-means (k-means++ seeding) where no cluster takes more than `capacity`.
+
+    Stops early once time.monotonic() passes `deadline` (after at least one
+    assignment).
+    """
+    n = len(points)
+    rng = np.random.default_rng(seed)
+    centres = np.empty((k, points.shape[1]))
+    centres[0] = points[rng.integers(n)]
+    closest = ((points - centres[0]) ** 2).sum(axis=1)
+    for c in range(1, k):
+        total = closest.sum()
+        pick = rng.choice(n, p=closest / total) if total > 0 else rng.integers(n)
+        centres[c] = points[pick]
+        closest = np.minimum(closest, ((points - centres[c]) ** 2).sum(axis=1))
+
+    labels = None
+    for _ in range(iterations):
+        sq_dist = ((points[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        new_labels = capacitated_assign(sq_dist, capacity)
+        if labels is not None and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for c in range(k):
+            members = points[labels == c]
+            if len(members):
+                centres[c] = members.mean(axis=0)
+        if deadline is not None and time.monotonic() > deadline:
+            break
+    return labels, centres
+
+
+def plan_days(conn, place_ids, dates, time_budget=DEFAULT_TIME_BUDGET):
+    """Split places over `dates` and order each day.
+
+    Returns the `days` payload save_trip() takes, plus total walking
+    distance. Places without coordinates are spread over the lightest days.
+    """
+    started = time.monotonic()
+    place_ids = list(dict.fromkeys(str(pid) for pid in place_ids))
+    coords = distance_store.coords(conn, place_ids)
+    located = [pid for pid in place_ids if pid in coords]
+    unlocated = [pid for pid in place_ids if pid not in coords]
+
+    days = [[] for _ in dates]
+    total = 0.0
+    k = min(len(dates), len(located))
+    if k:
+        lats = np.array([coords[p][0] for p in located])
+        lngs = np.array([coords[p][1] for p in located])
+        capacity = -(-len(located) // k)
+        # Clustering and ordering the clusters share the first quarter of
+        # the budget, the days the rest
+        deadline = started + time_budget / 4
+        labels, centres = balanced_kmeans(unit_vectors(lats, lngs), k, capacity,
+                                          deadline=deadline)
+
+        # Visit clusters in an order that keeps day-to-day hops short
+        centre_lat = np.degrees(np.arcsin(np.clip(centres[:, 2], -1, 1)))
+        centre_lng = np.degrees(np.arctan2(centres[:, 1], centres[:, 0]))
+        sequence, _, _ = solve(distance_matrix(centre_lat, centre_lng), False,
+                               max(0.0, deadline - time.monotonic()))
+
+        per_day = time_budget * 3 / 4 / k
+        for day, cluster in enumerate(sequence):
+            members = np.flatnonzero(labels == cluster)
+            dist = distance_matrix(lats[members], lngs[members])
+            order, length, _ = solve(dist, False, per_day)
+            days[day] = [located[members[i]] for i in order]
+            total += length
+
+    for pid in unlocated:
+        min(days, key=len).append(pid)
+
+    return {
+        "days": [{"date": date, "places": places} for date, places in zip(dates, days)],
+        "distance_m": round(total, 1),
+        "walking_s": round(float(travel_seconds(total))),
+        "unlocated": unlocated,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
@@ -0,0 +1,492 @@
+"""Reproducible load benchmark for the Flask app and the WebSocket hub.
+
+Builds a scratch database (a copy of database.db plus synthetic places, users
+and trips), points Gemini, Nominatim and WeatherAPI at local stub servers,
+and measures latency percentiles and throughput per endpoint under
+concurrent clients. Results are written as JSON; --compare reports
+regressions against an earlier run and exits non-zero if there are any.
+
+    python scripts/benchmark.py --places 100000 --concurrency 16 --out base.json
+    python scripts/benchmark.py --places 100000 --concurrency 16 --compare base.json
+    python scripts/benchmark.py --scenarios websocket --ws-clients 500
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Project modules (db, geocode, ai_routes, server...) read their settings from
+# the environment when first imported, so they are imported inside the
+# functions that use them, after main() has pointed the environment at the
+# scratch database and the stubs
+
+SCENARIOS = ("search", "fuzzy_search", "places", "locations", "save_trip", "trip_days", "agent", "websocket")
+HTTP_METRICS = ("p50_ms", "p99_ms", "throughput_rps")
+
+WORDS = ("old", "grand", "royal", "little", "national", "river", "harbour", "tower", "garden",
+         "palace", "bridge", "market", "museum", "cathedral", "castle", "fountain", "square",
+         "gallery", "park", "abbey", "opera", "lighthouse", "temple", "island", "forest")
+KINDS = ("Attraction", "Viewpoint", "Museum", "Park", "Monument")
+PASSWORD = "bench"
+
+
+# --- Stub upstreams -------------------------------------------------------
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Nominatim at /nominatim, WeatherAPI at /weather and the Gemini REST API
+    at /v1beta/models/..., each answering after `latency` seconds."""
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def reply(self, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query).get("q", [""])[0]
+        seed = random.Random(query)
+        if url.path == "/nominatim":
+            self.reply([{"lat": str(seed.uniform(-60, 60)), "lon": str(seed.uniform(-180, 180))}])
+        elif url.path == "/weather":
+            self.reply({"current": {"temp_c": seed.uniform(-5, 35) + random.random(),
+                                    "humidity": seed.randint(20, 90)}})
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = " ".join(part.get("text", "") for content in request.get("contents", [])
+                          for part in content.get("parts", []))
+        match = re.search(r"fly to ([A-Za-z .'-]+)", prompt)
+        if match:
+            text = json.dumps({"action": "fly", "place": match.group(1).strip()})
+        else:
+            text = "A lovely place to visit, with plenty to see and do. " * 4
+        candidate = {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                                     "finishReason": "STOP", "index": 0}]}
+        if "streamGenerateContent" in self.path:
+            self.reply([candidate] * 3)
+        else:
+            self.reply(candidate)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stubs(latency):
+    StubHandler.latency = latency
+    stub = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    return stub, f"http://127.0.0.1:{stub.server_port}"
+
+
+# --- Synthetic data -------------------------------------------------------
+
+def place_id(i):
+    return f"bench-{i}"
+
+
+def synthetic_places(n, seed):
+    from geocode import SEED_CITIES
+
+    rng = random.Random(seed)
+    for i in range(n):
+        city, country, lat, lng, _ = SEED_CITIES[i % len(SEED_CITIES)]
+        words = rng.sample(WORDS, 3)
+        name = " ".join(w.capitalize() for w in words)
+        description = f"The {words[0]} {words[1]} of {city}, near the {words[2]}. " * 3
+        yield (place_id(i), name, f"{city}, {country}", lat + rng.gauss(0, 0.05),
+               lng + rng.gauss(0, 0.05), description, None, rng.choice(KINDS),
+               round(rng.uniform(1, 5), 1))
+
+
+def build_database(path, places, users, trips_per_user, seed):
+    import ingest  # scripts/ingest.py, for its bulk loader
+    from migrations import migrate
+
+    source = os.path.join(ROOT, "database.db")
+    if os.path.exists(source):
+        shutil.copy(source, path)
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    print(f"Generating {places} places...")
+    ingest.load_places(conn, synthetic_places(places, seed))
+
+    rng = random.Random(seed)
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO users (username, email, password) VALUES (?, ?, ?)",
+                         [(f"bench{u}", f"bench{u}@example.com", PASSWORD) for u in range(users)])
+        for u in range(users):
+            for t in range(trips_per_user):
+                start = date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+                ndays = rng.randint(1, 5)
+                trip_id = conn.execute(
+                    "INSERT INTO trips (username, title, start, end) VALUES (?, ?, ?, ?)",
+                    (f"bench{u}", f"Trip {t}", start.isoformat(),
+                     (start + timedelta(days=ndays - 1)).isoformat())).lastrowid
+                conn.executemany(
+                    "INSERT INTO trip_days (trip_id, trip_date, place_id, pos) VALUES (?, ?, ?, ?)",
+                    [(trip_id, (start + timedelta(days=d)).isoformat(),
+                      place_id(rng.randrange(places)), pos)
+                     for d in range(ndays) for pos in range(rng.randint(3, 8))])
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def load_fixtures(path, users):
+    conn = sqlite3.connect(path)
+    trips = {}
+    for trip_id, username in conn.execute(
+            "SELECT id, username FROM trips WHERE username LIKE 'bench%'"):
+        trips.setdefault(username, []).append(trip_id)
+    places = conn.execute("SELECT COUNT(*) FROM places").fetchone()[0]
+    conn.close()
+    return {"trips": trips, "places": places, "users": [f"bench{u}" for u in range(users)]}
+
+
+# --- HTTP load ------------------------------------------------------------
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else None,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p90_ms": ms(percentile(ordered, 90)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+    }
+
+
+def run_load(base_url, send, total, concurrency, users=None, seed=0):
+    """Issue `total` requests from `concurrency` threads, each with its own
+    session (logged in as its own bench user when `users` is given)."""
+    barrier = threading.Barrier(concurrency + 1)
+    per_worker = [total // concurrency + (w < total % concurrency) for w in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        user = None
+        if users:
+            user = users[index % len(users)]
+            session.post(f"{base_url}/login", data={"username": user, "password": PASSWORD},
+                         allow_redirects=False)
+        barrier.wait()
+        latencies, errors = [], 0
+        for _ in range(per_worker[index]):
+            start = time.perf_counter()
+            try:
+                resp = send(session, base_url, rng, user)
+                resp.content
+                errors += resp.status_code >= 400
+            except requests.RequestException:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(worker, i) for i in range(concurrency)]
+        barrier.wait()
+        started = time.perf_counter()
+        results = [f.result() for f in futures]
+        elapsed = time.perf_counter() - started
+    return summarize([l for r in results for l in r[0]], sum(r[1] for r in results), elapsed)
+
+
+def http_scenarios(fixtures):
+    from geocode import SEED_CITIES
+
+    trips = fixtures["trips"]
+    cities = [c[0] for c in SEED_CITIES]
+
+    def search(session, url, rng, user):
+        word = rng.choice(WORDS)
+        return session.get(f"{url}/search", params={"q": word[:rng.randint(2, len(word))]})
+
+    def fuzzy_search(session, url, rng, user):
+        # A misspelt word (one letter dropped) only matches through the fallback
+        word = rng.choice(WORDS)
+        cut = rng.randrange(1, len(word) - 1)
+        return session.get(f"{url}/search", params={"q": word[:cut] + word[cut + 1:]})
+
+    def places(session, url, rng, user):
+        return session.get(f"{url}/places")
+
+    def locations(session, url, rng, user):
+        return session.get(f"{url}/api/locations")
+
+    def save_trip(session, url, rng, user):
+        start = date(2025, 6, 1)
+        days = [{"date": (start + timedelta(days=d)).isoformat(),
+                 "places": [place_id(rng.randrange(fixtures["places"])) for _ in range(5)]}
+                for d in range(3)]
+        return session.post(f"{url}/api/save_trip", json={
+            "title": "Bench trip", "start": days[0]["date"], "end": days[-1]["date"], "days": days})
+
+    def trip_days(session, url, rng, user):
+        return session.get(f"{url}/api/trip_days/{rng.choice(trips.get(user) or [0])}")
+
+    def agent(session, url, rng, user):
+        # A unique suffix defeats the prompt cache, so every call goes upstream
+        return session.post(f"{url}/agent",
+                            json={"message": f"fly to {rng.choice(cities)} #{rng.random()}"})
+
+    return {
+        "search": (search, False),
+        "fuzzy_search": (fuzzy_search, False),
+        "places": (places, False),
+        "locations": (locations, False),
+        "save_trip": (save_trip, True),
+        "trip_days": (trip_days, True),
+        "agent": (agent, False),
+    }
+
+
+def start_app():
+    from werkzeug.serving import make_server
+    from app import app
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no per-request access log
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# --- WebSocket fan-out ----------------------------------------------------
+
+async def websocket_benchmark(clients, per_client, distinct, seconds, interval, seed):
+    import websockets
+    import server
+
+    server.hub.interval = interval
+    rng = random.Random(seed)
+    landmarks = [{"id": f"lm{i}", "name": f"Landmark {i}", "lat": round(rng.uniform(-60, 60), 2),
+                  "lng": round(rng.uniform(-180, 180), 2)} for i in range(distinct)]
+    first_reading, counts = [], []
+    calls_before = server.hub.upstream_calls
+
+    async def client(ws_url, index):
+        picks = random.Random(seed + index).sample(landmarks, min(per_client, distinct))
+        received, pending = 0, {lm["id"] for lm in picks}
+        async with websockets.connect(ws_url, max_size=None) as ws:
+            subscribed = time.perf_counter()
+            await ws.send(json.dumps({"type": "subscribe", "landmarks": picks}))
+            deadline = subscribed + seconds
+            while (left := deadline - time.perf_counter()) > 0:
+                try:
+                    msg = json.loads(await asyncio.wait_for(ws.recv(), left))
+                except asyncio.TimeoutError:
+                    break
+                if msg.get("type") == "sensor":
+                    received += 1
+                    if msg["id"] in pending:
+                        pending.discard(msg["id"])
+                        first_reading.append(time.perf_counter() - subscribed)
+        counts.append(received)
+
+    async with websockets.serve(server.handle_connection, "127.0.0.1", 0) as ws_server:
+        port = ws_server.sockets[0].getsockname()[1]
+        started = time.perf_counter()
+        await asyncio.gather(*(client(f"ws://127.0.0.1:{port}", i) for i in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    stats = summarize(first_reading, 0, elapsed)
+    return {
+        "clients": clients,
+        "subscriptions": clients * min(per_client, distinct),
+        "distinct_landmarks": distinct,
+        "interval_s": interval,
+        "messages": sum(counts),
+        "messages_per_s": round(sum(counts) / elapsed, 1),
+        "upstream_calls": server.hub.upstream_calls - calls_before,
+        "first_reading_p50_ms": stats["p50_ms"],
+        "first_reading_p99_ms": stats["p99_ms"],
+    }
+
+
+# --- Reporting ------------------------------------------------------------
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(old, new, threshold):
+    """Print per-scenario changes; return the metrics that regressed."""
+    regressions = []
+    print(f"\n{'scenario':<12} {'metric':<16} {'before':>10} {'after':>10} {'change':>8}")
+    for name, result in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if not before:
+            continue
+        for metric in HTTP_METRICS + ("messages_per_s", "first_reading_p99_ms"):
+            a, b = before.get(metric), result.get(metric)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            # Latency should go down, throughput up
+            worse = -change if metric.endswith(("_rps", "_per_s")) else change
+            flag = " !" if worse > threshold else ""
+            if flag:
+                regressions.append(f"{name}.{metric}")
+            print(f"{name:<12} {metric:<16} {a:>10} {b:>10} {change:>+7.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=10000, help="synthetic places to generate")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--trips-per-user", type=int, default=4)
+    parser.add_argument("--db", help="scratch database to build (or reuse with --reuse-db)")
+    parser.add_argument("--reuse-db", action="store_true", help="skip generation if --db exists")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stub-latency", type=float, default=0.05,
+                        help="seconds each stubbed upstream call takes")
+    parser.add_argument("--ws-clients", type=int, default=50)
+    parser.add_argument("--ws-landmarks", type=int, default=20, help="subscriptions per client")
+    parser.add_argument("--ws-distinct", type=int, default=100, help="distinct landmarks overall")
+    parser.add_argument("--ws-seconds", type=float, default=10)
+    parser.add_argument("--ws-interval", type=float, default=1.0, help="weather poll interval")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON from an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: " + ", ".join(sorted(unknown)))
+
+    workdir = None
+    if args.db:
+        db_path = os.path.abspath(args.db)
+    else:
+        workdir = tempfile.mkdtemp(prefix="travelling-bench-")
+        db_path = os.path.join(workdir, "bench.db")
+
+    stub, stub_url = start_stubs(args.stub_latency)
+    # Must be set before any project module is imported: db, geocode,
+    # ai_routes and server read them at import time
+    os.environ.update({
+        "DB_PATH": db_path,
+        "NOMINATIM_URL": f"{stub_url}/nominatim",
+        "WEATHER_API_URL": f"{stub_url}/weather",
+        "WEATHER_API_KEY": "stub",
+        "GEMINI_API_ENDPOINT": stub_url,
+        "GOOGLE_API_KEY": "stub",
+    })
+
+    results = {}
+    try:
+        if not (args.reuse_db and os.path.exists(db_path)):
+            build_database(db_path, args.places, args.users, args.trips_per_user, args.seed)
+        fixtures = load_fixtures(db_path, args.users)
+        http = [s for s in scenarios if s != "websocket"]
+        if http:
+            app_server, base_url = start_app()
+            builders = http_scenarios(fixtures)
+            for name in http:
+                send, needs_login = builders[name]
+                print(f"Running {name}: {args.requests} requests, {args.concurrency} clients")
+                results[name] = run_load(base_url, send, args.requests, args.concurrency,
+                                         fixtures["users"] if needs_login else None, args.seed)
+            app_server.shutdown()
+        if "websocket" in scenarios:
+            print(f"Running websocket: {args.ws_clients} clients for {args.ws_seconds}s")
+            results["websocket"] = asyncio.run(websocket_benchmark(
+                args.ws_clients, args.ws_landmarks, args.ws_distinct, args.ws_seconds,
+                args.ws_interval, args.seed))
+    finally:
+        stub.shutdown()
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "places": fixtures["places"],
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "stub_latency_s": args.stub_latency,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    print(f"\n{'scenario':<12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, r in results.items():
+        if name == "websocket":
+            print(f"{name:<12} {r['messages_per_s']:>9} {r['first_reading_p50_ms']!s:>9} "
+                  f"{r['first_reading_p99_ms']!s:>9} {'-':>7}  "
+                  f"({r['upstream_calls']} upstream calls for {r['subscriptions']} subscriptions)")
+        else:
+            print(f"{name:<12} {r['throughput_rps']!s:>9} {r['p50_ms']!s:>9} "
+                  f"{r['p99_ms']!s:>9} {r['errors']:>7}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print("Regressions: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
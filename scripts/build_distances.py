@@ -0,0 +1,131 @@
+"""Build the precomputed distance store read by distances.py.
+
+Snapshots the coordinates of every located place and, per city, each
+place's k nearest neighbours, into memory-mappable .npy files under
+DISTANCE_STORE_DIR/<build>/, then publishes the build by rewriting
+DISTANCE_STORE_DIR/CURRENT. Workers pick up the new build on their next
+request; the previous build is kept for the ones still reading it.
+
+Run it after scripts/ingest.py (until then the app reads coordinates from
+the places table):
+
+    python scripts/build_distances.py [--k 20]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import current_generation
+from distances import DISTANCE_STORE_DIR
+from routing import unit_vectors
+from spatial import EARTH_RADIUS_M
+
+DB_PATH = os.getenv("DB_PATH", "database.db")
+
+DEFAULT_K = 20
+KEEP_BUILDS = 2   # the live build and the one before it
+
+
+def load_places(conn):
+    """(generation, ids, cities, lat/lng array) from one consistent read."""
+    conn.execute("BEGIN")
+    try:
+        generation = current_generation(conn)
+        rows = conn.execute("""
+            SELECT id, city, lat, lng FROM places
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+        """).fetchall()
+    finally:
+        conn.rollback()
+    ids = np.array([str(r[0]).encode() for r in rows], dtype=bytes)
+    cities = np.array([(r[1] or "").strip().lower() for r in rows], dtype=object)
+    coords = np.array([(r[2], r[3]) for r in rows], dtype=np.float64).reshape(-1, 2)
+    order = np.argsort(ids, kind="stable")
+    return generation, ids[order], cities[order], coords[order]
+
+
+def city_neighbours(cities, coords, k):
+    """(n, k) nearest places in the same city and metres to them, -1/inf padded.
+
+    Places without a city get no neighbours.
+    """
+    from scipy.spatial import cKDTree
+
+    n = len(cities)
+    neighbours = np.full((n, k), -1, dtype=np.int32)
+    metres = np.full((n, k), np.inf, dtype=np.float32)
+    if not n or not k:
+        return neighbours, metres
+    points = unit_vectors(coords[:, 0], coords[:, 1])
+
+    keys, labels = np.unique(cities, return_inverse=True)
+    order = np.argsort(labels, kind="stable")
+    groups = np.split(order, np.flatnonzero(np.diff(labels[order])) + 1)
+    for key, members in zip(keys, groups):
+        if not key or len(members) < 2:
+            continue
+        want = min(k + 1, len(members))
+        chords, hits = cKDTree(points[members]).query(points[members], k=want)
+        # Drop each place itself (not always the first hit when points coincide)
+        others = hits != np.arange(len(members))[:, None]
+        pick = np.argsort(~others, axis=1, kind="stable")[:, :want - 1]
+        hits = np.take_along_axis(hits, pick, axis=1)
+        chords = np.take_along_axis(chords, pick, axis=1)
+        neighbours[members, :want - 1] = members[hits]
+        metres[members, :want - 1] = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(chords / 2, 1.0))
+    return neighbours, metres
+
+
+def publish(root, build, arrays, meta):
+    path = os.path.join(root, build)
+    os.makedirs(path)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    pointer = os.path.join(root, "CURRENT")
+    with open(pointer + ".tmp", "w") as f:
+        f.write(build)
+    os.replace(pointer + ".tmp", pointer)   # atomic switch for readers
+
+    builds = sorted(d for d in os.listdir(root) if d.startswith("build-"))
+    for old in builds[:-KEEP_BUILDS]:
+        shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the precomputed place distance store.")
+    parser.add_argument("--k", type=int, default=DEFAULT_K,
+                        help="nearest neighbours kept per place within its city")
+    parser.add_argument("--out", default=DISTANCE_STORE_DIR, help="store directory")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(DB_PATH)
+    generation, ids, cities, coords = load_places(conn)
+    conn.close()
+    print(f"Loaded {len(ids)} located places (generation {generation})")
+
+    neighbours, metres = city_neighbours(cities, coords, max(0, args.k))
+    built_at = datetime.now(timezone.utc)
+    meta = {"generation": generation, "places": len(ids), "k": max(0, args.k),
+            "built_at": built_at.isoformat()}
+    os.makedirs(args.out, exist_ok=True)
+    path = publish(args.out, f"build-{built_at:%Y%m%dT%H%M%S%f}", {
+        "ids": ids, "coords": coords, "neighbours": neighbours, "neighbour_m": metres,
+    }, meta)
+    print(f"Published {path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Fail if importing the app gets slow or pulls in SDKs it should load lazily.
+
+Runs `python -X importtime -c "import app"` against a scratch copy of the
+database (importing app runs the migrations) and checks the cumulative time
+against IMPORT_BUDGET_MS, taking the best of a few runs to smooth out noise.
+
+    python scripts/check_import_time.py [--budget-ms 800] [--module app]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_BUDGET_MS = 800
+# Loaded on first use (see ai_routes.get_model, nearby.NearbyIndex._tree and
+# scripts/ingest.fetch_osm_pois); importing them at startup is a regression
+LAZY_MODULES = ("google.generativeai", "grpc", "scipy", "overpy")
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_times(module, env):
+    """{module: (self us, cumulative us)} for one `python -X importtime` run."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    times = {}
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float,
+                        default=float(os.getenv("IMPORT_BUDGET_MS", IMPORT_BUDGET_MS)))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DB_PATH=os.path.join(tmp, "database.db"))
+        source = os.path.join(ROOT, "database.db")
+        if os.path.exists(source):
+            shutil.copy(source, env["DB_PATH"])
+        import_times(args.module, env)  # migrations and .pyc files, not measured
+        runs = [import_times(args.module, env) for _ in range(args.runs)]
+
+    best = min(runs, key=lambda t: t[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"Slowest imports under {args.module} (cumulative ms):")
+    for name, (_, cumulative) in sorted(best.items(), key=lambda kv: -kv[1][1])[1:args.top + 1]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+
+    failures = []
+    eager = [lazy for lazy in LAZY_MODULES
+             if any(name == lazy or name.startswith(lazy + ".") for name in best)]
+    if eager:
+        failures.append("imported at startup but should be lazy: " + ", ".join(eager))
+    if total_ms > args.budget_ms:
+        failures.append(f"import {args.module} took {total_ms:.0f} ms, budget {args.budget_ms:.0f} ms")
+
+    print(f"import {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    for failure in failures:
+        print("FAIL " + failure)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Assert that every query the app runs is answered from an index.
+
+Runs EXPLAIN QUERY PLAN for the queries in app.py, ai_routes.py and the
+modules they use against a migrated scratch copy of the database, and exits
+non-zero if any of them falls back to a full table (or full index) scan.
+Queries that read a whole table on purpose (the globe feed) are listed in
+FULL_SCANS. Plans depend on the planner statistics, so the copy is first
+filled with synthetic places, favorites and trips and ANALYZEd.
+
+    python scripts/check_query_plans.py [path/to/database.db] [--places 50000]
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+from feed import LEGACY_FIELDS, feed_query
+from fuzzy import fuzzy_query
+from ingest import load_places
+from migrations import migrate, refresh_stats
+from search_index import SEARCH_COLUMNS, search_query
+from spatial import PLACE_COLUMNS, bbox_query, cluster_query
+
+# SQL built by the same helpers the routes use
+HELPER_QUERIES = {
+    "search": search_query("rom", "", 50, 0, SEARCH_COLUMNS)[:2],
+    "search by category": search_query("rom", "viewpoint", 50, 0, SEARCH_COLUMNS)[:2],
+    "fuzzy search": fuzzy_query('{name city} : (("colosseum" OR "coliseum") AND "ro"*)'),
+    "feed page": feed_query(LEGACY_FIELDS, "lng", 0, 501)[:2],
+    "viewport": bbox_query(48.0, 49.0, 2.0, 3.0, 501),
+    "viewport clusters": cluster_query(40.0, 50.0, 0.0, 10.0, 0.5),
+}
+
+QUERIES = {
+    "login": ("SELECT * FROM users WHERE username = ? AND password = ?", ("u", "p")),
+    "profile": ("SELECT * FROM users WHERE username = ?", ("u",)),
+    "profile update": ("UPDATE users SET username = ?, email = ?, password = ? WHERE username = ?",
+                       ("u", "e", "p", "u")),
+    "places by category": ("SELECT id FROM places WHERE LOWER(category) = ?", ("viewpoint",)),
+    "places by city": ("SELECT id FROM places WHERE city = ? COLLATE NOCASE", ("rome, italy",)),
+    "geocode place name": ("SELECT lat, lng FROM places WHERE name = ? COLLATE NOCASE AND lat IS NOT NULL LIMIT 1",
+                           ("eiffel tower",)),
+    "geocode gazetteer": ("SELECT lat, lng, country FROM gazetteer WHERE name_key = ? ORDER BY population DESC",
+                          ("paris",)),
+    "geocode cache": ("SELECT lat, lng, found, created FROM geocode_cache WHERE query = ?", ("paris",)),
+    "prompt cache": ("SELECT response, created FROM prompt_cache WHERE prompt = ?", ("k",)),
+    "favorite toggle": ("SELECT 1 FROM favorites WHERE username=? AND place_id=?", ("u", "1")),
+    "favorites page": ("""
+        SELECT p.id, p.name, p.city, p.image_url, p.description,
+               p.category, p.rating, p.lat, p.lng
+        FROM   favorites f
+        JOIN   places    p ON p.id = CAST(f.place_id AS TEXT)
+        WHERE  f.username = ?
+    """, ("u",)),
+    "trip days": ("""
+        SELECT td.trip_date, p.name, p.city
+        FROM trip_days td
+        JOIN places p ON td.place_id = p.id
+        JOIN trips t ON td.trip_id = t.id
+        WHERE td.trip_id = ? AND t.username = ?
+        ORDER BY td.trip_date, td.pos
+    """, (1, "u")),
+    "trips page": ("SELECT id,title,start,end FROM trips WHERE username = ? ORDER BY start DESC", ("u",)),
+    "trip owner check": ("SELECT id FROM trips WHERE id = ? AND username = ?", (1, "u")),
+    "trip delete cascade": ("SELECT 1 FROM trip_days WHERE trip_id = ?", (1,)),
+    "trip day rewrite": ("DELETE FROM trip_days WHERE trip_id = ? AND trip_date = ?", (1, "2025-07-01")),
+    "trip update load": ("SELECT trip_date, place_id FROM trip_days WHERE trip_id = ? ORDER BY trip_date, pos",
+                         (1,)),
+}
+
+# Queries that read the whole table by design
+FULL_SCANS = {
+    "globe feed": ("SELECT id, name, city, lat, lng FROM places WHERE lat IS NOT NULL AND lng IS NOT NULL", ()),
+    "nearby index": (f"SELECT {', '.join(PLACE_COLUMNS)} FROM places "
+                     "WHERE lat IS NOT NULL AND lng IS NOT NULL", ()),
+    "fuzzy vocabulary": ("SELECT term, SUM(doc) FROM places_fts_terms "
+                         "WHERE col IN ('name', 'city') GROUP BY term", ()),
+}
+
+# A virtual table scan with constraints passed to it, e.g. an FTS MATCH
+# ("INDEX 0:M1") or an R*Tree box ("INDEX 2:D1B0"); "INDEX 1:" is an R*Tree
+# rowid lookup. Any other SCAN, "USING COVERING INDEX" included, reads
+# every row.
+_CONSTRAINED_VTAB = re.compile(r"SCAN \S+ VIRTUAL TABLE INDEX (1:|\d+:\S+)")
+
+
+def plan(conn, sql, params):
+    return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def full_scans(details):
+    return [d for d in details if d.startswith("SCAN ") and not _CONSTRAINED_VTAB.match(d)]
+
+
+def fill(conn, places, seed=0):
+    """Synthetic rows in roughly production proportions, then fresh stats."""
+    rng = random.Random(seed)
+    cities = [f"City {i}" for i in range(max(1, places // 200))]
+    load_places(conn, ((f"syn{i}", f"Place {i}", rng.choice(cities), rng.uniform(-60, 70),
+                        rng.uniform(-180, 180), "", "", rng.choice(("Attraction", "Viewpoint")),
+                        round(rng.uniform(3, 5), 1)) for i in range(places)))
+    users = [f"user{i}" for i in range(max(1, places // 100))]
+    with conn:
+        conn.executemany("INSERT OR IGNORE INTO favorites (username, place_id) VALUES (?, ?)",
+                         [(rng.choice(users), f"syn{rng.randrange(places)}") for _ in range(places // 10)])
+        conn.executemany("INSERT INTO trips (username, title, start, end) VALUES (?, 'T', '2025-07-01', '2025-07-03')",
+                         [(u,) for u in users])
+        conn.executemany("""
+            INSERT INTO trip_days (trip_id, trip_date, place_id, pos)
+            SELECT id, '2025-07-01', ?, ? FROM trips ORDER BY random() LIMIT 1
+        """, [(f"syn{rng.randrange(places)}", pos) for pos in range(places // 20)])
+    refresh_stats(conn)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the app's queries use indexes.")
+    parser.add_argument("path", nargs="?", default="database.db")
+    parser.add_argument("--places", type=int, default=50000,
+                        help="synthetic places added before ANALYZE (0 to keep the data as is)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, "plans.db")
+        if os.path.exists(args.path):
+            shutil.copy(args.path, scratch)
+        conn = sqlite3.connect(scratch)
+        migrate(conn)
+        if args.places:
+            fill(conn, args.places)
+
+        failures = 0
+        for name, (sql, params) in {**HELPER_QUERIES, **QUERIES}.items():
+            details = plan(conn, sql, params)
+            scans = full_scans(details)
+            status = "FAIL" if scans else "ok"
+            failures += bool(scans)
+            print(f"{status:4} {name}: {' | '.join(details)}")
+        for name, (sql, params) in FULL_SCANS.items():
+            print(f"scan {name}: {' | '.join(plan(conn, sql, params))}")
+        conn.close()
+
+    if failures:
+        print(f"{failures} queries fall back to a full table scan")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
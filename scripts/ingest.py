@@ -1,136 +1,581 @@
-import overpy
+import argparse
+import hashlib
+import json
+import os
+import re
 import sqlite3
+import sys
+import time
 import requests
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from decimal import Decimal
+from requests.adapters import HTTPAdapter
+from urllib.parse import quote
 
-DB_PATH = "database.db"
-API = overpy.Overpass()
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cache import bump_generation, ensure_generation_counter
+from migrations import migrate, refresh_stats
+from search_index import ensure_search_index, optimize_search_index, rebuild_search_index
+from spatial import ensure_spatial_index, rebuild_spatial_index
 
-# Find tourist destinations, gather details
-def fetch_osm_pois(lat, lon, radius=5000):
+DB_PATH = os.getenv("DB_PATH", "database.db")
+
+AREAS = [
+    ("Paris, France", 48.8566, 2.3522),
+    ("Rome, Italy", 41.9028, 12.4964),
+    ("New York, USA", 40.7128, -74.0060),
+    ("San Francisco, USA", 37.7749, -122.4194),
+    ("London, UK", 51.5074, -0.1278),
+    ("Barcelona, Spain", 41.3851, 2.1734),
+    ("Sydney, Australia", -33.8688, 151.2093),
+    ("Toronto, Canada", 43.651070, -79.347015),
+    ("Cape Town, South Africa", -33.9249, 18.4241),
+    ("Bangkok, Thailand", 13.7563, 100.5018),
+    ("Dubai, UAE", 25.276987, 55.296249),
+    ("Berlin, Germany", 52.5200, 13.4050)
+]
+
+MAX_PLACES = 100
+# The public Overpass instance only grants a couple of concurrent slots
+OVERPASS_WORKERS = 2
+WIKI_WORKERS = 8
+HTTP_TIMEOUT = 10
+# Overpass data lags the main OSM database by a few minutes; re-check a
+# generous window before the last successful fetch
+CHECKPOINT_OVERLAP = 3600
+
+# Incremental ingestion state: one row per run, a checkpoint per area (written
+# in the same transaction as the area's places) and a content hash per node
+INGEST_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ingest_runs (
+        id       INTEGER PRIMARY KEY AUTOINCREMENT,
+        started  REAL NOT NULL,
+        finished REAL,
+        status   TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_areas (
+        area         TEXT PRIMARY KEY,
+        run_id       INTEGER,
+        status       TEXT NOT NULL,
+        last_run     REAL,
+        last_success REAL,
+        node_count   INTEGER NOT NULL DEFAULT 0,
+        changed      INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ingest_nodes (
+        node_id      TEXT PRIMARY KEY,
+        area         TEXT NOT NULL,
+        version      INTEGER,
+        timestamp    TEXT,
+        content_hash TEXT NOT NULL,
+        wiki_title   TEXT
+    )
+    """,
+]
+
+UPSERT_NODE = """
+INSERT OR REPLACE INTO ingest_nodes (node_id, area, version, timestamp, content_hash, wiki_title)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_AREA = """
+INSERT INTO ingest_areas (area, run_id, status, last_run, last_success, node_count, changed)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (area) DO UPDATE SET
+    run_id = excluded.run_id,
+    status = excluded.status,
+    last_run = excluded.last_run,
+    last_success = COALESCE(excluded.last_success, last_success),
+    node_count = excluded.node_count,
+    changed = excluded.changed
+"""
+
+# Upsert that leaves the rating alone and skips rows that did not change, so
+# re-runs don't churn the search/spatial triggers or the data generation
+UPSERT_PLACE = """
+INSERT INTO places (id, name, city, lat, lng, description, image_url, category, rating)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    name = excluded.name,
+    city = excluded.city,
+    lat = excluded.lat,
+    lng = excluded.lng,
+    description = excluded.description,
+    image_url = excluded.image_url,
+    category = excluded.category
+WHERE name IS NOT excluded.name
+   OR city IS NOT excluded.city
+   OR lat IS NOT excluded.lat
+   OR lng IS NOT excluded.lng
+   OR description IS NOT excluded.description
+   OR image_url IS NOT excluded.image_url
+   OR category IS NOT excluded.category
+"""
+
+# Find tourist destinations, gather details. With `since` (a unix time) only
+# nodes edited after it are returned, which is how incremental runs detect
+# unchanged areas without downloading them.
+def fetch_osm_pois(lat, lon, radius=5000, since=None):
+    newer = ""
+    if since is not None:
+        stamp = datetime.fromtimestamp(since, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        newer = f'(newer:"{stamp}")'
     query = f"""
     [out:json][timeout:25];
     (
-      node["tourism"="attraction"](around:{radius},{lat},{lon});
-      node["tourism"="viewpoint"](around:{radius},{lat},{lon});
+      node["tourism"="attraction"]{newer}(around:{radius},{lat},{lon});
+      node["tourism"="viewpoint"]{newer}(around:{radius},{lat},{lon});
     );
-    out center;
+    out meta center;
     """
-    return API.query(query)
+    # Only the Overpass crawl needs overpy; bulk loads and the benchmark don't
+    import overpy
 
-def seed_osm():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS places (
-        id TEXT PRIMARY KEY,
-        name TEXT,
-        city TEXT,
-        lat REAL,
-        lng REAL,
-        description TEXT,
-        image_url TEXT,
-        category TEXT,
-        rating REAL
+    # One client per call: queries run concurrently from worker threads
+    return overpy.Overpass().query(query)
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = "Travelling-Search/1.0 (ingest)"
+    return session
+
+def ensure_schema(conn):
+    # The migrations create places and the triggers that keep the search and
+    # spatial indexes in sync with every insert below and bump the data
+    # generation so the app drops its cached results
+    migrate(conn)
+    for stmt in INGEST_SCHEMA:
+        conn.execute(stmt)
+    conn.commit()
+
+# Turn an OSM node into a place candidate, or None if it should be skipped
+def node_to_place(node, city_name):
+    tags = node.tags
+    place_name = tags.get("name:en")
+    if not place_name:
+        return None  # skip if there's no English name
+
+    # Filter out non-real locations (if no address info)
+    if not any(k.startswith("addr:") for k in tags):
+        return None
+
+    # Convert lat/lon to float if Decimal
+    lat_val = float(node.lat) if isinstance(node.lat, Decimal) else node.lat
+    lon_val = float(node.lon) if isinstance(node.lon, Decimal) else node.lon
+
+    category = (
+        "Attraction" if tags.get("tourism") == "attraction" else
+        "Viewpoint" if tags.get("tourism") == "viewpoint" else
+        "Other"
     )
-    """)
+
+    wiki_title = None
+    wikipedia_tag = tags.get("wikipedia:en") or tags.get("wikipedia")
+    if wikipedia_tag and ":" in wikipedia_tag:
+        _, wiki_title = wikipedia_tag.split(":", 1)
+
+    # Everything the place row is derived from, so an unchanged hash means
+    # the node can be skipped without touching Wikipedia
+    content = json.dumps([sorted(tags.items()), str(node.lat), str(node.lon)])
+    attributes = getattr(node, "attributes", {}) or {}
+
+    return {
+        "id": str(node.id),
+        "name": place_name,
+        "city": city_name,
+        "lat": lat_val,
+        "lng": lon_val,
+        "category": category,
+        "wiki_title": wiki_title,
+        "hash": hashlib.sha1(content.encode()).hexdigest(),
+        "version": attributes.get("version"),
+        "timestamp": attributes.get("timestamp"),
+        "reuse": None,
+    }
+
+# Description (Wikipedia tag text) and image fetching, then the row to insert
+def enrich_place(session, place):
+    image_url = "No Image available"
+    description = "No Description available"
+    if place["reuse"]:
+        # Same Wikipedia article as last run: keep the stored text and image
+        description, image_url = place["reuse"]
+    elif place["wiki_title"]:
+        image_url, description = fetch_wikipedia_image_and_description(place["wiki_title"], session)
+    rating = round(random.uniform(3.0, 5.0), 1)
+    return (place["id"], place["name"], place["city"], place["lat"], place["lng"],
+            description, image_url, place["category"], rating)
+
+# Resume the last run if it never finished, otherwise start a new one
+def start_run(conn, resume=True):
+    row = conn.execute(
+        "SELECT id FROM ingest_runs WHERE status = 'running' ORDER BY id DESC LIMIT 1"
+    ).fetchone()
+    if row and resume:
+        print(f"Resuming interrupted ingest run {row[0]}")
+        return row[0]
+    conn.execute("UPDATE ingest_runs SET status = 'abandoned' WHERE status = 'running'")
+    run_id = conn.execute(
+        "INSERT INTO ingest_runs (started, status) VALUES (?, 'running')", (time.time(),)
+    ).lastrowid
+    conn.commit()
+    return run_id
+
+def finish_run(conn, run_id, status="done"):
+    conn.execute("UPDATE ingest_runs SET finished = ?, status = ? WHERE id = ?",
+                 (time.time(), status, run_id))
     conn.commit()
-    areas = [
-        ("Paris, France", 48.8566, 2.3522),
-        ("Rome, Italy", 41.9028, 12.4964),
-        ("New York, USA", 40.7128, -74.0060),
-        ("San Francisco, USA", 37.7749, -122.4194),
-        ("London, UK", 51.5074, -0.1278),
-        ("Barcelona, Spain", 41.3851, 2.1734),
-        ("Sydney, Australia", -33.8688, 151.2093),
-        ("Toronto, Canada", 43.651070, -79.347015),
-        ("Cape Town, South Africa", -33.9249, 18.4241),
-        ("Bangkok, Thailand", 13.7563, 100.5018),
-        ("Dubai, UAE", 25.276987, 55.296249),
-        ("Berlin, Germany", 52.5200, 13.4050)
-    ]
+
+def seed_osm(areas=AREAS, max_places=MAX_PLACES,
+             overpass_workers=OVERPASS_WORKERS, wiki_workers=WIKI_WORKERS,
+             incremental=True, resume=True):
+    """Seed places from Overpass.
+
+    Incremental runs only ask Overpass for nodes edited since each area's
+    last successful fetch and skip nodes whose content hash is unchanged.
+    Areas already finished by an interrupted run are skipped on resume.
+    `max_places` caps the places written per run (0 = no cap).
+    """
+    conn = sqlite3.connect(DB_PATH)
+    ensure_schema(conn)
+    run_id = start_run(conn, resume)
+
+    checkpoints = {
+        area: (area_run, status, last_success)
+        for area, area_run, status, last_success in conn.execute(
+            "SELECT area, run_id, status, last_success FROM ingest_areas")
+    }
+    areas = [a for a in areas
+             if checkpoints.get(a[0], (None, None, None))[:2] != (run_id, "done")]
+    if not areas:
+        print("Nothing left to ingest for this run.")
+
+    # Skip duplicates: one query up front instead of one per node
+    seen = {(name, city): pid for pid, name, city in conn.execute("SELECT id, name, city FROM places")}
+    node_state = {node_id: (content_hash, wiki_title) for node_id, content_hash, wiki_title in
+                  conn.execute("SELECT node_id, content_hash, wiki_title FROM ingest_nodes")}
+    session = make_session(wiki_workers)
 
     added = 0
-    MAX_PLACES = 100
+    unchanged = 0
+    done = 0
+    started = time.perf_counter()
+    capped = False
+
+    # Overpass queries for every area run concurrently; each area is enriched
+    # by the Wikipedia pool and written in one transaction as soon as it lands
+    with ThreadPoolExecutor(overpass_workers) as overpass, ThreadPoolExecutor(wiki_workers) as wiki:
+        futures = {}
+        for city_name, lat, lon in areas:
+            last_success = checkpoints.get(city_name, (None, None, None))[2]
+            since = last_success - CHECKPOINT_OVERLAP if incremental and last_success else None
+            print(f"Fetching places near {city_name}" + (" (changes only)..." if since else "..."))
+            futures[overpass.submit(fetch_osm_pois, lat, lon, since=since)] = (city_name, time.time())
+
+        for future in as_completed(futures):
+            city_name, fetched_at = futures[future]
+            done += 1
+            try:
+                res = future.result()
+            except Exception as e:
+                print(f"Failed to fetch data for {city_name}: {e}")
+                with conn:
+                    conn.execute(UPSERT_AREA, (city_name, run_id, "failed", fetched_at, None, 0, 0))
+                continue
 
-    for city_name, lat, lon in areas:
-        print(f"Fetching places near {city_name}...")
+            candidates = []
+            for node in res.nodes:
+                if max_places and added + len(candidates) >= max_places:
+                    capped = True
+                    break
+                place = node_to_place(node, city_name)
+                if place is None:
+                    continue
+                known = node_state.get(place["id"])
+                if known and known[0] == place["hash"]:
+                    unchanged += 1
+                    continue
+                owner = seen.get((place["name"], city_name))
+                if owner is not None and owner != place["id"]:
+                    continue
+                seen[(place["name"], city_name)] = place["id"]
+                if known and known[1] == place["wiki_title"]:
+                    place["reuse"] = conn.execute(
+                        "SELECT description, image_url FROM places WHERE id = ?", (place["id"],)
+                    ).fetchone()
+                candidates.append(place)
+
+            rows = list(wiki.map(lambda p: enrich_place(session, p), candidates))
+            # Places, node hashes and the area checkpoint commit together, so
+            # a crash never leaves an area marked done with missing rows
+            with conn:
+                conn.executemany(UPSERT_PLACE, rows)
+                conn.executemany(UPSERT_NODE, [
+                    (p["id"], city_name, p["version"], p["timestamp"], p["hash"], p["wiki_title"])
+                    for p in candidates
+                ])
+                status = "partial" if capped else "done"
+                last_success = None if capped else fetched_at
+                conn.execute(UPSERT_AREA, (city_name, run_id, status, fetched_at,
+                                           last_success, len(res.nodes), len(rows)))
+            for p in candidates:
+                node_state[p["id"]] = (p["hash"], p["wiki_title"])
+            added += len(rows)
+
+            elapsed = time.perf_counter() - started
+            print(f"[{done}/{len(areas)}] {city_name}: {len(rows)} places "
+                  f"(total {added}, {unchanged} unchanged, {added / elapsed:.1f} places/s)")
+
+            if capped:
+                for pending in futures:
+                    pending.cancel()
+                break
+
+    optimize_search_index(conn)
+    refresh_stats(conn)
+    # A capped run stays resumable; the next invocation picks up the rest
+    finish_run(conn, run_id, "running" if capped else "done")
+    conn.close()
+    elapsed = time.perf_counter() - started
+    print(f"🌍 OSM data seeding complete: {added} places from {done} areas in {elapsed:.1f}s.")
+
+# ---------------------------------------------------------------------------
+# Offline bulk import from .osm.pbf / GeoJSON extracts
+# ---------------------------------------------------------------------------
+
+BULK_BATCH_SIZE = 50000
+TOURISM_KINDS = {"attraction": "Attraction", "viewpoint": "Viewpoint"}
+GEOJSON_LINE_SUFFIXES = (".geojsonl", ".geojsons", ".geojsonseq", ".ndjson", ".jsonl")
+
+def ring_centroid(ring):
+    # Area-weighted centroid of a closed [lon, lat] ring (planar, fine at POI scale)
+    area = cx = cy = 0.0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        cross = x0 * y1 - x1 * y0
+        area += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    if abs(area) < 1e-18:
+        n = len(ring)
+        return sum(p[0] for p in ring) / n, sum(p[1] for p in ring) / n
+    return cx / (3 * area), cy / (3 * area)
+
+def geometry_point(geometry):
+    """(lat, lng) for a Point, or the centroid of a (Multi)Polygon's outer ring."""
+    kind = geometry.get("type")
+    coords = geometry.get("coordinates")
+    if not coords:
+        return None
+    if kind == "Point":
+        lon, lat = coords[:2]
+    elif kind == "Polygon":
+        lon, lat = ring_centroid([tuple(p[:2]) for p in coords[0]])
+    elif kind == "MultiPolygon":
+        # Largest polygon by vertex count stands in for the whole feature
+        outer = max((poly[0] for poly in coords), key=len)
+        lon, lat = ring_centroid([tuple(p[:2]) for p in outer])
+    else:
+        return None
+    return float(lat), float(lon)
+
+def tags_to_row(osm_id, tags, lat, lng):
+    """Build a places row from OSM tags, or None if the feature is filtered out."""
+    category = TOURISM_KINDS.get(tags.get("tourism"))
+    name = tags.get("name:en") or tags.get("name")
+    if osm_id is None or osm_id == "":
+        return None   # rows are upserted on id; "None" would merge them all
+    if not category or not name or lat is None or lng is None:
+        return None
+    city = tags.get("addr:city", "")
+    if city and tags.get("addr:country"):
+        city = f"{city}, {tags['addr:country']}"
+    return (str(osm_id), name, city, lat, lng,
+            tags.get("description", "No Description available"),
+            tags.get("image", "No Image available"),
+            category, round(random.uniform(3.0, 5.0), 1))
+
+_ARRAY_SEPARATORS = re.compile(r"[\s,]*")
+
+def _decode_stream(fh, decoder, buf, chunk_size):
+    # Yield JSON values from a comma-separated array body until its closing ].
+    # Decodes in place from a moving position; the buffer is only sliced when
+    # it runs dry and is refilled.
+    pos = 0
+    while True:
+        pos = _ARRAY_SEPARATORS.match(buf, pos).end()
+        if buf.startswith("]", pos):
+            return
         try:
-            res = fetch_osm_pois(lat, lon)
-        except Exception as e:
-            print(f"Failed to fetch data for {city_name}: {e}")
+            if pos == len(buf):
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            value, pos = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                raise
+            buf = buf[pos:] + chunk
+            pos = 0
             continue
+        yield value
 
-        for node in res.nodes:
-            if added >= MAX_PLACES:
-                break
+def iter_geojson_features(path, chunk_size=1 << 20):
+    """Stream features from a GeoJSON file without loading it whole.
 
-            tags = node.tags
-            place_name_en = tags.get("name:en")
-            if not place_name_en:
-                continue  # skip if there's no English name
-            place_name = place_name_en
+    Line-delimited files (GeoJSONSeq / NDJSON) are read line by line; a
+    FeatureCollection is decoded one feature at a time from its array.
+    """
+    with open(path, encoding="utf-8") as fh:
+        if path.endswith(GEOJSON_LINE_SUFFIXES):
+            for line in fh:
+                line = line.strip().lstrip("\x1e")
+                if line:
+                    yield json.loads(line)
+            return
 
-            # Filter out non-real locations (if no address info)
-            if not any(k.startswith("addr:") for k in tags):
-                continue
+        buf = ""
+        while True:
+            key = buf.find('"features"')
+            if key != -1:
+                start = buf.find("[", key)
+                if start != -1:
+                    break
+            else:
+                buf = buf[-16:]
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"{path}: no \"features\" array found")
+            buf += chunk
+        yield from _decode_stream(fh, json.JSONDecoder(), buf[start + 1:], chunk_size)
+
+def iter_geojson_places(path):
+    for feature in iter_geojson_features(path):
+        props = feature.get("properties") or {}
+        tags = props.get("tags") if isinstance(props.get("tags"), dict) else props
+        point = geometry_point(feature.get("geometry") or {})
+        if point is None:
+            continue
+        osm_id = feature.get("id") or props.get("@id") or props.get("osm_id") or props.get("id")
+        if osm_id is None:
+            # osmium exports omit ids unless asked (--add-unique-id); derive
+            # one from the point and name so re-imports update the same row
+            name = tags.get("name:en") or tags.get("name") or ""
+            key = f"{point[0]:.7f},{point[1]:.7f},{name}"
+            osm_id = "g" + hashlib.sha1(key.encode()).hexdigest()[:16]
+        row = tags_to_row(osm_id, tags, *point)
+        if row:
+            yield row
 
-            # Skip duplicates
-            c.execute("SELECT COUNT(*) FROM places WHERE name = ? AND city = ?", (place_name, city_name))
-            if c.fetchone()[0] > 0:
+def iter_pbf_places(path):
+    # pyosmium is only needed for .pbf input
+    try:
+        import osmium
+    except ImportError:
+        raise SystemExit("Reading .osm.pbf files needs pyosmium: pip install osmium")
+
+    processor = (osmium.FileProcessor(path)
+                 .with_locations()
+                 .with_areas()
+                 .with_filter(osmium.filter.KeyFilter("tourism")))
+    for obj in processor:
+        tags = {tag.k: tag.v for tag in obj.tags}
+        if tags.get("tourism") not in TOURISM_KINDS:
+            continue
+        if obj.is_node():
+            if not obj.location.valid():
+                continue
+            row = tags_to_row(obj.id, tags, obj.location.lat, obj.location.lon)
+        elif obj.is_area():
+            ring = [(n.lon, n.lat) for outer in obj.outer_rings() for n in outer]
+            if len(ring) < 3:
                 continue
+            lon, lat = ring_centroid(ring)
+            prefix = "w" if obj.from_way() else "r"
+            row = tags_to_row(f"{prefix}{obj.orig_id()}", tags, lat, lon)
+        else:
+            continue
+        if row:
+            yield row
 
-            # Convert lat/lon to float if Decimal
-            lat_val = float(node.lat) if isinstance(node.lat, Decimal) else node.lat
-            lon_val = float(node.lon) if isinstance(node.lon, Decimal) else node.lon
-
-            # Insert into DB
-            # Description (Wikipedia tag text) and image fetching
-            wikipedia_tag = tags.get("wikipedia", "")
-            image_url = "No Image available"
-            description = "No Description available"
-            category = (
-                "Attraction" if tags.get("tourism") == "attraction" else
-                "Viewpoint" if tags.get("tourism") == "viewpoint" else
-                "Other"
-            )
-            rating = round(random.uniform(3.0, 5.0), 1)
-
-            wikipedia_tag = tags.get("wikipedia:en") or tags.get("wikipedia")
-            if wikipedia_tag and ":" in wikipedia_tag:
-                _, wiki_title = wikipedia_tag.split(":", 1)
-                image_url, description = fetch_wikipedia_image_and_description(wiki_title)
-
-            c.execute("""
-            INSERT OR IGNORE INTO places (id, name, city, lat, lng, description, image_url, category, rating, cesium_asset_id, )
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                str(node.id),
-                place_name,
-                city_name,
-                lat_val,
-                lon_val,
-                description,
-                image_url,
-                category,
-                rating
-            ))
-
-            print(f"Added: {place_name} ({city_name})")
-            added += 1
+def load_places(conn, rows, batch_size=BULK_BATCH_SIZE):
+    """Upsert an iterable of place rows (UPSERT_PLACE order) at disk speed.
 
+    Index triggers are dropped for the load and the search/spatial indexes
+    are rebuilt in one pass afterwards.
+    """
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")
+
+    triggers = [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'places'")]
+    for name in triggers:
+        conn.execute(f'DROP TRIGGER "{name}"')
+    conn.commit()
+
+    loaded = 0
+    started = time.perf_counter()
+    try:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                with conn:
+                    conn.executemany(UPSERT_PLACE, batch)
+                loaded += len(batch)
+                batch = []
+                print(f"  {loaded} places ({loaded / (time.perf_counter() - started):.0f}/s)")
+        if batch:
+            with conn:
+                conn.executemany(UPSERT_PLACE, batch)
+            loaded += len(batch)
+    finally:
+        # Recreate the triggers and rebuild the indexes they maintain
+        print("Rebuilding search and spatial indexes...")
+        ensure_search_index(conn)
+        rebuild_search_index(conn)
+        ensure_spatial_index(conn)
+        rebuild_spatial_index(conn)
+        ensure_generation_counter(conn)
+        bump_generation(conn)
         conn.commit()
+        optimize_search_index(conn)
+        # Fresh planner statistics for the new table sizes; stats taken on a
+        # near-empty table make the planner scan places instead of the R*Tree
+        refresh_stats(conn)
+        conn.execute("PRAGMA synchronous = NORMAL")
+    return loaded
 
-    conn.close()
-    print("🌍 OSM data seeding complete.")
+
+def bulk_import(path, batch_size=BULK_BATCH_SIZE):
+    """Load tourism POIs from a local OSM PBF or GeoJSON extract."""
+    rows = iter_pbf_places(path) if path.endswith(".pbf") else iter_geojson_places(path)
+
+    conn = sqlite3.connect(DB_PATH)
+    ensure_schema(conn)
+    started = time.perf_counter()
+    try:
+        loaded = load_places(conn, rows, batch_size)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"🌍 Bulk import complete: {loaded} places from {path} in {elapsed:.1f}s.")
+    return loaded
 
 # Find wikipdia images for search results
-def fetch_wikipedia_image_and_description(title):
+def fetch_wikipedia_image_and_description(title, session=None):
     try:
-        url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{title}"
-        resp = requests.get(url)
+        url = f"https://en.wikipedia.org/api/rest_v1/page/summary/{quote(title, safe='')}"
+        resp = (session or requests).get(url, timeout=HTTP_TIMEOUT)
         if resp.status_code == 200:
             data = resp.json()
             img = data.get("thumbnail", {}).get("source", "No image available")
@@ -138,9 +583,30 @@ def fetch_wikipedia_image_and_description(title):
             return img, desc
     except Exception as e:
         print(f"Error fetching Wikipedia data for {title}: {e}")
-    
+
     return "No image available", "No description available"
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Seed the places table from OpenStreetMap.")
+    parser.add_argument("--file", metavar="PATH",
+                        help="bulk import a local .osm.pbf or GeoJSON extract instead of querying Overpass")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    parser.add_argument("--max-places", type=int, default=MAX_PLACES)
+    parser.add_argument("--overpass-workers", type=int, default=OVERPASS_WORKERS)
+    parser.add_argument("--wiki-workers", type=int, default=WIKI_WORKERS)
+    parser.add_argument("--full", action="store_true",
+                        help="refetch every area instead of only the changes since its checkpoint")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="start a new run even if the last one was interrupted")
+    args = parser.parse_args()
+    if args.file:
+        bulk_import(args.file, args.batch_size)
+        return
+    seed_osm(max_places=args.max_places, overpass_workers=args.overpass_workers,
+             wiki_workers=args.wiki_workers, incremental=not args.full,
+             resume=not args.no_resume)
+
+
 if __name__ == "__main__":
-    seed_osm()
+    main()
@@ -0,0 +1,121 @@
+import re
+import sqlite3
+
+# Full-text index over places, kept in sync with the places table by triggers.
+# The unicode61 tokenizer folds case and accents, and the prefix indexes make
+# short type-ahead prefixes ("ro", "rom") cheap to look up.
+FTS_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS places_fts USING fts5(
+        name, city, description, category,
+        content='places', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_fts_ai AFTER INSERT ON places BEGIN
+        INSERT INTO places_fts (rowid, name, city, description, category)
+        VALUES (new.rowid, new.name, new.city, new.description, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_fts_ad AFTER DELETE ON places BEGIN
+        INSERT INTO places_fts (places_fts, rowid, name, city, description, category)
+        VALUES ('delete', old.rowid, old.name, old.city, old.description, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_fts_au AFTER UPDATE ON places BEGIN
+        INSERT INTO places_fts (places_fts, rowid, name, city, description, category)
+        VALUES ('delete', old.rowid, old.name, old.city, old.description, old.category);
+        INSERT INTO places_fts (rowid, name, city, description, category)
+        VALUES (new.rowid, new.name, new.city, new.description, new.category);
+    END
+    """,
+]
+
+# bm25 column weights: name, city, description, category
+BM25_WEIGHTS = (10.0, 5.0, 1.0, 2.0)
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_STREAM_LIMIT = 10000   # format=ndjson streams rows instead of building a list
+
+SEARCH_COLUMNS = ("id", "name", "city", "image_url", "description",
+                  "category", "rating", "lat", "lng")
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_search_index(conn):
+    """Create the FTS table and its triggers, back-filling it on first run."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'places_fts'"
+    ).fetchone()
+    for stmt in FTS_SCHEMA:
+        conn.execute(stmt)
+    if not exists:
+        rebuild_search_index(conn)
+    conn.commit()
+
+
+def rebuild_search_index(conn):
+    conn.execute("INSERT INTO places_fts (places_fts) VALUES ('rebuild')")
+
+
+def optimize_search_index(conn):
+    # Merges the index b-trees after large ingests
+    conn.execute("INSERT INTO places_fts (places_fts) VALUES ('optimize')")
+    conn.commit()
+
+
+def build_match_query(term):
+    # Every word must match, each one as a prefix ("ro ma" finds "Roman Forum").
+    # Tokens are quoted so FTS operators in user input are treated as text.
+    tokens = _TOKEN_RE.findall(term.lower())
+    if not tokens:
+        return ""
+    return " ".join(f'"{tok}"*' for tok in tokens)
+
+
+def clamp_limit(limit, offset, max_limit=MAX_LIMIT):
+    limit = DEFAULT_LIMIT if limit is None else max(1, min(limit, max_limit))
+    offset = 0 if offset is None else max(0, offset)
+    return limit, offset
+
+
+def search_query(term, category="", limit=DEFAULT_LIMIT, offset=0, fields=SEARCH_COLUMNS):
+    """(sql, params) for a search, or None when `term` has no words."""
+    match = build_match_query(term)
+    if not match:
+        return None
+    category = (category or "").lower()
+
+    columns = ", ".join(f"p.{c}" for c in fields)
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = f"""
+        SELECT {columns}
+        FROM   places_fts
+        JOIN   places p ON p.rowid = places_fts.rowid
+        WHERE  places_fts MATCH ?
+        AND    (? = '' OR LOWER(p.category) = ?)
+        ORDER  BY bm25(places_fts, {weights})
+        LIMIT  ? OFFSET ?
+    """
+    return sql, (match, category, category, limit, offset)
+
+
+def search_places(conn, term, category="", limit=DEFAULT_LIMIT, offset=0, fields=SEARCH_COLUMNS):
+    """Return places matching `term`, best BM25 match first."""
+    limit, offset = clamp_limit(limit, offset)
+    query = search_query(term, category, limit, offset, fields)
+    if query is None:
+        return []
+    try:
+        rows = conn.execute(*query).fetchall()
+    except sqlite3.OperationalError as e:
+        print("Search query failed:", e)
+        return []
+
+    return [dict(zip(fields, row)) for row in rows]
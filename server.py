@@ -4,17 +4,30 @@ import json
 import sqlite3
 import requests
 import os
+import signal
+import time
 from dotenv import load_dotenv
+from prometheus_client import start_http_server
+from metrics import stats_collector, track_upstream
 # WORK IN PROGRESS SENSOR DATA WEATHER
 load_dotenv()
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1/current.json")
+POLL_INTERVAL = 10  # seconds between upstream fetches per landmark
+METRICS_PORT = os.getenv("METRICS_PORT")  # serve Prometheus metrics when set
+WS_HOST = os.getenv("WS_HOST", "localhost")
+WS_PORT = int(os.getenv("WS_PORT", 8765))
+HTTP_TIMEOUT = 5
+
+session = requests.Session()
 
 # Fetch real-time weather using WeatherAPI
 def get_weather(lat, lon):
     try:
-        url = f"http://api.weatherapi.com/v1/current.json?key={WEATHER_API_KEY}&q={lat},{lon}"
-        response = requests.get(url)
-        data = response.json()
+        params = {"key": WEATHER_API_KEY, "q": f"{lat},{lon}"}
+        with track_upstream("weatherapi"):
+            response = session.get(WEATHER_API_URL, params=params, timeout=HTTP_TIMEOUT)
+            data = response.json()
         temperature = data['current']['temp_c']
         humidity = data['current']['humidity']
         return round(temperature, 2), humidity
@@ -22,46 +35,222 @@ def get_weather(lat, lon):
         print(f"⚠️ Error fetching weather for ({lat}, {lon}): {e}")
         return None, None
 
-# Stream weather updates for the subscribed landmark
-async def stream_weather(websocket, lat, lon, name):
-    try:
-        print(f"Starting stream for {name} ({lat}, {lon})")
+
+class WeatherHub:
+    """One upstream poller per landmark, fanned out to every subscriber.
+
+    Landmarks are deduplicated on coordinates rounded to ~1 km, so any number
+    of clients watching the Eiffel Tower share one WeatherAPI call per
+    interval. A poller starts with its first subscriber and is cancelled
+    when the last one leaves. Subscribers are callbacks taking a reading.
+    """
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.subscribers = {}   # key -> set of callbacks
+        self.pollers = {}       # key -> asyncio.Task
+        self.latest = {}        # key -> (monotonic time, reading)
+        self.upstream_calls = 0
+
+    def stats(self):
+        return {"landmarks": len(self.pollers), "upstream_calls": self.upstream_calls}
+
+    @staticmethod
+    def key(lat, lon):
+        return round(float(lat), 2), round(float(lon), 2)
+
+    def subscribe(self, lat, lon, callback):
+        key = self.key(lat, lon)
+        self.subscribers.setdefault(key, set()).add(callback)
+
+        # A fresh cached reading is delivered right away
+        cached = self.latest.get(key)
+        if cached and time.monotonic() - cached[0] < self.interval:
+            callback(cached[1])
+
+        if key not in self.pollers:
+            self.pollers[key] = asyncio.create_task(self._poll(key))
+        return key
+
+    def unsubscribe(self, key, callback):
+        callbacks = self.subscribers.get(key)
+        if callbacks is None:
+            return
+        callbacks.discard(callback)
+        if not callbacks:
+            del self.subscribers[key]
+            poller = self.pollers.pop(key, None)
+            if poller:
+                poller.cancel()
+
+    async def _poll(self, key):
+        lat, lon = key
+        print(f"Starting poller for ({lat}, {lon})")
+        try:
+            while key in self.subscribers:
+                self.upstream_calls += 1
+                temp, hum = await asyncio.to_thread(get_weather, lat, lon)
+                if temp is not None:
+                    reading = {"temperature": temp, "humidity": hum}
+                    self.latest[key] = (time.monotonic(), reading)
+                    for callback in list(self.subscribers.get(key, ())):
+                        callback(reading)
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            print(f"Stopped poller for ({lat}, {lon})")
+            raise
+
+
+hub = WeatherHub()
+stats_collector.register("weather_hub", hub.stats)
+
+MAX_SUBSCRIPTIONS = 500   # per socket
+BATCH_WINDOW = 0.05       # seconds to gather readings into one batch frame
+
+
+class ClientSession:
+    """Subscriptions and the outgoing queue for one WebSocket.
+
+    Protocol (client -> server):
+      {"type": "subscribe", "id": "eiffel", "name": "Eiffel Tower", "lat": .., "lng": ..}
+      {"type": "subscribe", "landmarks": [{...}, {...}]}
+      {"type": "unsubscribe", "id": "eiffel"}        (or "ids": [...], or "all": true)
+      {"type": "options", "batch": true}
+    The id defaults to the name. Readings go out as "sensor" frames, or as
+    one "sensor_batch" frame per send when batching is on.
+
+    The outgoing queue holds at most one pending reading per subscription:
+    while the socket is slow a newer reading replaces the stale one, so
+    memory per client is bounded by its subscription count.
+    """
+
+    def __init__(self, websocket, hub):
+        self.websocket = websocket
+        self.hub = hub
+        self.subscriptions = {}  # id -> (key, callback, landmark)
+        self.pending = {}        # id -> payload, newest only
+        self.batch = False
+        self.coalesced = 0
+        self._wakeup = asyncio.Event()
+        self._sender = asyncio.create_task(self._send_loop())
+
+    async def handle(self, data):
+        kind = data.get("type")
+        if kind == "subscribe":
+            for landmark in data.get("landmarks") or [data]:
+                await self.subscribe(landmark)
+        elif kind == "unsubscribe":
+            if data.get("all"):
+                ids = list(self.subscriptions)
+            else:
+                ids = data.get("ids") or [data.get("id") or data.get("name")]
+            for sub_id in ids:
+                self.unsubscribe(sub_id)
+            await self.send({"type": "unsubscribed", "ids": ids})
+        elif kind == "options":
+            self.batch = bool(data.get("batch", self.batch))
+        else:
+            await self.send({"type": "error", "message": f"unknown message type {kind!r}"})
+
+    async def subscribe(self, landmark):
+        name = landmark["name"]
+        sub_id = str(landmark.get("id") or name)
+        lat, lng = float(landmark["lat"]), float(landmark["lng"])
+        if sub_id not in self.subscriptions and len(self.subscriptions) >= MAX_SUBSCRIPTIONS:
+            await self.send({"type": "error", "id": sub_id, "message": "too many subscriptions"})
+            return
+        self.unsubscribe(sub_id)
+
+        info = {"id": sub_id, "landmark": name, "lat": lat, "lng": lng}
+
+        def deliver(reading):
+            self.push(sub_id, {"type": "sensor", **info, **reading})
+
+        self.subscriptions[sub_id] = (None, deliver, info)
+        await self.send({"type": "subscribed", "id": sub_id})
+        key = self.hub.subscribe(lat, lng, deliver)
+        self.subscriptions[sub_id] = (key, deliver, info)
+        print(f"Starting stream for {name} ({lat}, {lng})")
+
+    def unsubscribe(self, sub_id):
+        entry = self.subscriptions.pop(sub_id, None)
+        self.pending.pop(sub_id, None)
+        if entry and entry[0] is not None:
+            self.hub.unsubscribe(entry[0], entry[1])
+
+    def push(self, sub_id, payload):
+        if sub_id not in self.subscriptions:
+            return
+        if sub_id in self.pending:
+            self.coalesced += 1
+        self.pending[sub_id] = payload
+        self._wakeup.set()
+
+    async def send(self, payload):
+        await self.websocket.send(json.dumps(payload))
+
+    async def _send_loop(self):
         while True:
-            temp, hum = get_weather(lat, lon)
-            if temp is not None:
-                payload = {
-                    "type": "sensor",
-                    "landmark": name,
-                    "lat": lat,
-                    "lng": lon,
-                    "temperature": temp,
-                    "humidity": hum
-                }
-                await websocket.send(json.dumps(payload))
-            await asyncio.sleep(10)  # Wait before next fetch (adjustable)
-    except websockets.exceptions.ConnectionClosed:
-        print(f"🔌 Connection closed while streaming {name}")
+            await self._wakeup.wait()
+            if self.batch:
+                await asyncio.sleep(BATCH_WINDOW)
+            self._wakeup.clear()
+            readings = list(self.pending.values())
+            self.pending.clear()
+            if self.batch and readings:
+                await self.send({"type": "sensor_batch", "readings": readings})
+            else:
+                for payload in readings:
+                    await self.send(payload)
+
+    async def close(self):
+        for sub_id in list(self.subscriptions):
+            self.unsubscribe(sub_id)
+        self._sender.cancel()
+        try:
+            await self._sender
+        except (asyncio.CancelledError, websockets.exceptions.ConnectionClosed):
+            pass
 
 # 🧭 Main WebSocket handler
 async def handle_connection(websocket):
+    client = ClientSession(websocket, hub)
     try:
         async for message in websocket:
             try:
-                data = json.loads(message)
-                if data["type"] == "subscribe":
-                    lat = data["lat"]
-                    lng = data["lng"]
-                    name = data["name"]
-                    await stream_weather(websocket, lat, lng, name)
+                await client.handle(json.loads(message))
+            except websockets.exceptions.ConnectionClosed:
+                raise
             except Exception as e:
                 print(f"Error handling message: {e}")
+                await client.send({"type": "error", "message": str(e)})
     except websockets.exceptions.ConnectionClosed:
         print("🔌 Client disconnected")
+    finally:
+        await client.close()
 
-# 🧠 Run WebSocket server
+# 🧠 Run WebSocket server until SIGTERM/SIGINT, then close every socket
+# with 1001 (going away) so clients reconnect to the next instance
 async def main():
-    async with websockets.serve(handle_connection, "localhost", 8765):
-        print("WebSocket server running at ws://localhost:8765")
-        await asyncio.Future()  # Run forever
+    if METRICS_PORT:
+        start_http_server(int(METRICS_PORT))
+        print(f"Metrics at http://localhost:{METRICS_PORT}/metrics")
+
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda: stop.done() or stop.set_result(None))
+        except NotImplementedError:  # Windows: Ctrl+C still raises KeyboardInterrupt
+            pass
+
+    async with websockets.serve(handle_connection, WS_HOST, WS_PORT):
+        print(f"WebSocket server running at ws://{WS_HOST}:{WS_PORT}")
+        await stop
+    print("WebSocket server stopped")
+
+def run():
+    asyncio.run(main())
 
-asyncio.run(main())
+if __name__ == "__main__":
+    run()
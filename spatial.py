@@ -0,0 +1,160 @@
+import math
+
+# R*Tree over place coordinates, keyed on places.rowid and kept in sync by
+# triggers. Points are stored as zero-area boxes.
+RTREE_SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree USING rtree(
+        id, min_lat, max_lat, min_lng, max_lng
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_rtree_ai AFTER INSERT ON places
+    WHEN new.lat IS NOT NULL AND new.lng IS NOT NULL BEGIN
+        INSERT INTO places_rtree VALUES (new.rowid, new.lat, new.lat, new.lng, new.lng);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_rtree_ad AFTER DELETE ON places BEGIN
+        DELETE FROM places_rtree WHERE id = old.rowid;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS places_rtree_au AFTER UPDATE OF lat, lng ON places BEGIN
+        DELETE FROM places_rtree WHERE id = old.rowid;
+        INSERT INTO places_rtree
+        SELECT new.rowid, new.lat, new.lat, new.lng, new.lng
+        WHERE new.lat IS NOT NULL AND new.lng IS NOT NULL;
+    END
+    """,
+]
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEG_LAT = 111320.0
+
+# Below this zoom level viewport results are aggregated into grid clusters
+CLUSTER_MAX_ZOOM = 9
+DEFAULT_VIEWPORT_LIMIT = 500
+MAX_VIEWPORT_LIMIT = 5000
+
+PLACE_COLUMNS = ("id", "name", "city", "category", "rating", "lat", "lng")
+
+
+def ensure_spatial_index(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'places_rtree'"
+    ).fetchone()
+    for stmt in RTREE_SCHEMA:
+        conn.execute(stmt)
+    if not exists:
+        rebuild_spatial_index(conn)
+    conn.commit()
+
+
+def rebuild_spatial_index(conn):
+    conn.execute("DELETE FROM places_rtree")
+    conn.execute("""
+        INSERT INTO places_rtree
+        SELECT rowid, lat, lat, lng, lng
+        FROM   places
+        WHERE  lat IS NOT NULL AND lng IS NOT NULL
+    """)
+
+
+def parse_bbox(value):
+    """Parse "west,south,east,north" degrees; raises ValueError if malformed."""
+    parts = [float(v) for v in value.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox needs west,south,east,north")
+    west, south, east, north = parts
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bbox out of range")
+    return west, south, east, north
+
+
+def radius_bbox(lat, lng, radius_m):
+    dlat = radius_m / METERS_PER_DEG_LAT
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or north >= 90 or south <= -90:
+        return -180.0, south, 180.0, north
+    dlng = min(180.0, radius_m / (METERS_PER_DEG_LAT * cos_lat))
+    west, east = lng - dlng, lng + dlng
+    if dlng >= 180:
+        return -180.0, south, 180.0, north
+    # Wrap across the antimeridian; parse_bbox semantics allow west > east
+    if west < -180:
+        west += 360
+    if east > 180:
+        east -= 360
+    return west, south, east, north
+
+
+def _lng_ranges(west, east):
+    # A box crossing the antimeridian is split into two plain ranges
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+def cluster_cell_size(zoom):
+    # Roughly 8x8 cells per map tile at the given web-mercator zoom
+    return 360.0 / (2 ** max(0, zoom)) / 8
+
+
+# The R*Tree is always the outer loop (CROSS JOIN fixes the join order):
+# with stale or skewed statistics the planner would otherwise scan places
+# and probe the tree once per row.
+
+def bbox_query(south, north, lo, hi, limit):
+    """(sql, params) for the places in one plain longitude range."""
+    columns = ", ".join(f"p.{c}" for c in PLACE_COLUMNS)
+    sql = f"""
+        SELECT {columns}
+        FROM   places_rtree r
+        CROSS  JOIN places p ON p.rowid = r.id
+        WHERE  r.max_lat >= ? AND r.min_lat <= ?
+        AND    r.max_lng >= ? AND r.min_lng <= ?
+        AND    p.lat BETWEEN ? AND ? AND p.lng BETWEEN ? AND ?
+        ORDER  BY p.rating DESC
+        LIMIT  ?
+    """
+    return sql, (south, north, lo, hi, south, north, lo, hi, limit)
+
+
+def cluster_query(south, north, lo, hi, cell):
+    """(sql, params) for grid-cell clusters in one plain longitude range."""
+    sql = """
+        SELECT COUNT(*), AVG(p.lat), AVG(p.lng), MIN(p.id), MIN(p.name)
+        FROM   places_rtree r
+        CROSS  JOIN places p ON p.rowid = r.id
+        WHERE  r.max_lat >= ? AND r.min_lat <= ?
+        AND    r.max_lng >= ? AND r.min_lng <= ?
+        AND    p.lat BETWEEN ? AND ? AND p.lng BETWEEN ? AND ?
+        GROUP  BY CAST((p.lat + 90) / ? AS INTEGER),
+                  CAST((p.lng + 180) / ? AS INTEGER)
+    """
+    return sql, (south, north, lo, hi, south, north, lo, hi, cell, cell)
+
+
+def query_bbox(conn, west, south, east, north, limit=DEFAULT_VIEWPORT_LIMIT):
+    results = []
+    for lo, hi in _lng_ranges(west, east):
+        rows = conn.execute(*bbox_query(south, north, lo, hi, limit + 1)).fetchall()
+        results.extend(dict(zip(PLACE_COLUMNS, row)) for row in rows)
+    results.sort(key=lambda p: p["rating"] or 0, reverse=True)
+    return results[:limit], len(results) > limit
+
+
+def query_clusters(conn, west, south, east, north, zoom):
+    cell = cluster_cell_size(zoom)
+    clusters = []
+    for lo, hi in _lng_ranges(west, east):
+        rows = conn.execute(*cluster_query(south, north, lo, hi, cell)).fetchall()
+        for count, lat, lng, pid, name in rows:
+            cluster = {"count": count, "lat": lat, "lng": lng}
+            if count == 1:
+                cluster.update(id=pid, name=name)
+            clusters.append(cluster)
+    return clusters
+
@@ -0,0 +1,39 @@
+"""Production entry point for the Flask app.
+
+    gunicorn -c gunicorn.conf.py
+
+Importing this module builds the read-only state every worker needs (compiled
+templates, the globe feed, the nearby and fuzzy search indexes, the distance
+store mapping). With preload_app the master does it once and the workers
+share those pages after fork.
+"""
+from app import app, place_feed
+from db import close_pool, get_pool
+from distances import distance_store
+from feed import FEED_FIELDS, LEGACY_FIELDS
+from fuzzy import fuzzy_index
+from nearby import nearby_index
+
+app.config["TEMPLATES_AUTO_RELOAD"] = False
+
+
+def preload():
+    # Compile every template into the Jinja cache; without auto-reload they
+    # are never re-read from disk
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    with get_pool().connection() as conn:
+        for fmt in ("lng", "lon"):
+            place_feed.get(conn, fmt, LEGACY_FIELDS)
+        place_feed.get(conn, "geojson", FEED_FIELDS)
+        nearby_index.query(conn, 0.0, 0.0, k=1)
+        fuzzy_index.vocabulary(conn)
+    distance_store.current()
+    # Workers open their own connections; none may be inherited across fork
+    close_pool()
+    print(f"Preloaded {len(place_feed.rows)} places and "
+          f"{len(app.jinja_env.list_templates())} templates")
+
+
+preload()